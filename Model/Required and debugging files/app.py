@@ -1,50 +1,64 @@
+import os
+import sys
+import time
+import traceback
+
 import streamlit as st
-import joblib
-import numpy as np
-import pandas as pd
 from care_insights import CARE_INSIGHTS
+import inference
+from inference import build_features, read_patient_table, score_frame
+from instrumentation import METRICS, PROFILER
+from prediction_cache import PredictionCache, model_version
+from screening import screen_patient
 
 st.set_page_config(page_title="Multi-Disease Predictor", layout="wide")
 
 # ==========================================
 # 1. LOAD MODELS
 # ==========================================
+# Models are loaded on first use of their page. SHER_MODEL_CACHE_MB caps the memory
+# they may hold (least recently used are evicted), SHER_PRELOAD_MODELS=1 warms them up
+# in the background. SHER_MODEL_REGISTRY=<folder> serves the CURRENT versions of a
+# model registry instead, picking up newly activated versions without a restart.
+# SHER_METRICS_DUMP=<file.json> writes the stage timings and counters every
+# SHER_METRICS_INTERVAL seconds (default 10), and the profile to <file.json>.prof
+# while profiling is switched on (SHER_PROFILE=1 or the SHER_PROFILE_FLAG file).
+# A model is read from its model_<Disease>/ or .sherbin export when that is not older
+# than the .sav; SHER_MODEL_FORMATS (e.g. "compact,arrays", see inference.MODEL_FORMATS)
+# changes the order. The file used is logged to stderr.
 @st.cache_resource
 def load_models():
-    models = {}
-    model_files = {
-        "Diabetes": "model_Diabetes.sav",
-        "Heart": "model_Heart.sav",
-        "Kidney": "model_Kidney.sav",
-        "Liver": "model_Liver.sav",
-        "Hypertension": "model_Hypertension.sav",
-        "Malaria_Pneumonia": "model_Malaria_Pneumonia.sav"
-    }
-    
-    for name, filename in model_files.items():
-        try:
-            models[name] = joblib.load(filename)
-        except Exception as e:
-            st.error(f"Could not load {name} model. Make sure '{filename}' is in the folder.")
-    return models
+    cache_mb = os.environ.get("SHER_MODEL_CACHE_MB")
+    dump_path = os.environ.get("SHER_METRICS_DUMP")
+    if dump_path:
+        METRICS.start_dump(dump_path, float(os.environ.get("SHER_METRICS_INTERVAL", 10)), profiler=PROFILER)
+    return inference.load_models(
+        max_bytes=int(float(cache_mb) * 1024 * 1024) if cache_mb else None,
+        preload=os.environ.get("SHER_PRELOAD_MODELS") == "1",
+        registry=os.environ.get("SHER_MODEL_REGISTRY"),
+        formats=inference.parse_formats(os.environ.get("SHER_MODEL_FORMATS", ",".join(inference.MODEL_FORMATS))),
+        on_error=lambda name, filename, e: st.error(f"Could not load {name} model. Make sure '{filename}' is in the folder."),
+        on_load=lambda name, path: print(f"📦 Loaded {name} model from '{path}'", file=sys.stderr)
+    )
+
+# Results of predict() are cached across reruns (SHER_PREDICTION_CACHE entries, 0 to
+# turn off; SHER_PREDICTION_CACHE_TTL seconds). SHER_PREDICTION_CACHE_DB=<file.db>
+# shares them with other sessions and server workers through SQLite.
+@st.cache_resource
+def load_prediction_cache():
+    max_entries = int(os.environ.get("SHER_PREDICTION_CACHE", 4096))
+    if max_entries <= 0:
+        return None
+    ttl = os.environ.get("SHER_PREDICTION_CACHE_TTL")
+    return PredictionCache(max_entries, ttl=float(ttl) if ttl else None, db_path=os.environ.get("SHER_PREDICTION_CACHE_DB"))
 
 models = load_models()
+prediction_cache = load_prediction_cache()
 
 # ==========================================
 # 2. HELPER FUNCTIONS
 # ==========================================
 
-def get_risk_level(probability):
-    """
-    Determine risk level based on probability of the disease.
-    """
-    if probability < 0.4:
-        return "Low"
-    elif 0.4 <= probability <= 0.7:
-        return "Moderate"
-    else:
-        return "High"
-
 def display_insights(disease_name, risk_level):
     """
     Display Dos and Donts based on disease and risk level.
@@ -67,122 +81,44 @@ def display_insights(disease_name, risk_level):
     else:
         st.info("No specific insights available for this result.")
 
-def make_prediction_and_display(model_name, input_data, feature_names=None):
+def make_prediction_and_display(model_name, record):
     """
     Central function to handle prediction, risk calculation, and display.
-    Feature_names is generic placeholder if needed for dataframe conversion, 
-    but models here seem to accept arrays.
+    record holds the form fields; the model lookup and the feature building run
+    inside the error handling, so a model that failed to load shows a message.
     """
+    start = time.perf_counter()
     try:
-        model = models[model_name]
-        
-        # Get raw prediction
-        prediction = model.predict(input_data)[0]
-        
-        # Get probability if available
-        probability = 0.0
-        risk_level = "Low"
-        disease_detected = False
-        
-        if hasattr(model, "predict_proba"):
-            probs = model.predict_proba(input_data)[0]
+        with METRICS.timer("model_lookup", disease=model_name):
+            model = models[model_name]
+        input_data = build_features(model_name, model, record)
+        if prediction_cache is not None:
+            result = prediction_cache.predict(model_name, model, input_data, model_version(models, model_name))
         else:
-            probs = None
-
-        # --- LOGIC PER MODEL ---
-        if model_name == "Heart":
-            # Heart: 0 = High Risk, 1 = Low Risk
-            # Probability of Disease (class 0) = probs[0]
-            prob_disease = probs[0] if probs is not None else (1.0 if prediction == 0 else 0.0)
-            
-            risk_level = get_risk_level(prob_disease)
-            
-            if prediction == 0:
-                st.error(f"⚠️ Prediction: Heart Disease Detected (Confidence: {prob_disease:.2%})")
-                disease_detected = True
-            else:
-                if risk_level == "Moderate":
-                    st.warning(f"⚠️ Prediction: Low Risk, but Moderate Probability ({prob_disease:.2%})")
-                else:
-                    st.success(f"✅ Prediction: Heart is Healthy (Confidence: {1-prob_disease:.2%})")
-            
-            # Display insights based on calculated risk level
-            display_insights("Heart", risk_level)
-
-        elif model_name == "Malaria_Pneumonia":
-             # 0=Healthy? No, model returns strings 'Malaria' or 'Pneumonia'
-             # classes_ = ['Malaria', 'Pneumonia']
-             
-             # If the model returns a string (e.g. "Pneumonia"), we need to map it to index
-             if isinstance(prediction, str):
-                 try:
-                     # Get index of the predicted class to find its probability
-                     class_idx = list(model.classes_).index(prediction)
-                     prob_disease = probs[class_idx] if probs is not None else 1.0
-                 except (ValueError, IndexError):
-                     prob_disease = 1.0
-                     
-                 risk_level = get_risk_level(prob_disease)
-                 
-                 st.error(f"⚠️ Prediction: {prediction} Detected (Confidence: {prob_disease:.2%})")
-                 display_insights("Malaria_Pneumonia", risk_level)
-                 
-             else:
-                 # Legacy integer handling if generic
-                 if prediction == 0:
-                     prob_healthy = probs[0] if probs is not None else 1.0
-                     st.success(f"✅ Prediction: Healthy (Confidence: {prob_healthy:.2%})")
-                     display_insights("Malaria_Pneumonia", "Low")
-                 else:
-                     condition = "Malaria" if prediction == 1 else "Pneumonia"
-                     prob_disease = probs[prediction] if probs is not None else 1.0
-                     
-                     risk_level = get_risk_level(prob_disease)
-                     
-                     st.error(f"⚠️ Prediction: {condition} Detected (Confidence: {prob_disease:.2%})")
-                     display_insights("Malaria_Pneumonia", risk_level)
+            result = inference.predict(model_name, model, input_data)
 
+        if result["status"] == "detected":
+            st.error(f"⚠️ Prediction: {result['summary']} (Confidence: {result['confidence']:.2%})")
+        elif result["status"] == "elevated":
+            st.warning(f"⚠️ Prediction: {result['summary']} ({result['confidence']:.2%})")
         else:
-            # Standard Binary: 1 = Disease, 0 = Healthy
-            # Diabetes, Liver, Kidney, Hypertension
-            
-            # Robust probability extraction
-            prob_disease = 0.0
-            if probs is not None:
-                if len(probs) > 1:
-                    prob_disease = probs[1]
-                elif len(probs) == 1:
-                    # Model has only 1 class. 
-                    # If that class represents disease (e.g. 1), take the prob. 
-                    # If it represents healthy (e.g. 0 or -1 typically considered non-1), take 0.
-                    # We check the PREDICTION to determine context.
-                    # Original logic was: if prediction == 1 -> Disease.
-                    if prediction == 1:
-                        prob_disease = probs[0]
-                    else:
-                        prob_disease = 0.0
-            else:
-                prob_disease = 1.0 if prediction == 1 else 0.0
-
-            risk_level = get_risk_level(prob_disease)
-            
-            if prediction == 1:
-                st.error(f"⚠️ Prediction: High Risk of {model_name} (Confidence: {prob_disease:.2%})")
-                display_insights(model_name, risk_level)
-            else:
-                if risk_level == "Moderate": # Healthy class predicted but probability of disease is in moderate range (e.g. 0.45)
-                     st.warning(f"⚠️ Prediction: Low Risk, but elevated probability ({prob_disease:.2%})")
-                     display_insights(model_name, risk_level)
-                else:
-                     st.success(f"✅ Prediction: Low Risk (Healthy) (Confidence: {1-prob_disease:.2%})")
-                     display_insights(model_name, "Low")
-            
+            st.success(f"✅ Prediction: {result['summary']} (Confidence: {result['confidence']:.2%})")
+
+        with METRICS.timer("insights", disease=model_name):
+            display_insights(model_name, result["insights_level"])
+
     except ValueError as e:
+        METRICS.inc("sher_failed_requests_total", disease=model_name, error="ValueError")
         st.error(f"⚠️ Input Error: {e}")
     except KeyError:
+        METRICS.inc("sher_failed_requests_total", disease=model_name, error="KeyError")
         st.error(f"⚠️ Model {model_name} not found.")
     except Exception as e:
+        METRICS.inc("sher_failed_requests_total", disease=model_name, error=type(e).__name__)
+        traceback.print_exc(file=sys.stderr)
         st.error(f"An error occurred: {e}")
+    finally:
+        METRICS.observe("sher_request_seconds", time.perf_counter() - start, disease=model_name)
 
 # ==========================================
 # 3. PAGE UI
@@ -192,7 +128,9 @@ st.title("🏥 AI-Powered Health Risk Predictor")
 st.markdown("Select a disease from the sidebar to assess your risk and get personalized care insights.")
 
 # Sidebar
-selected_disease = st.sidebar.selectbox("Select Disease Model", list(models.keys()))
+SCREENING_MODE = "Full Screening"
+BATCH_MODE = "Batch Upload (CSV)"
+selected_disease = st.sidebar.selectbox("Select Disease Model", list(models.keys()) + [SCREENING_MODE, BATCH_MODE])
 
 # --- DIABETES ---
 if selected_disease == "Diabetes":
@@ -212,12 +150,11 @@ if selected_disease == "Diabetes":
         age = st.number_input("Age", 0, 120, 30)
 
     if st.button("Predict Diabetes Risk"):
-        input_data = [[0, pregnancies, glucose, bp, skin, insulin, bmi, dpf, age]] # Note: first 0 might be a dummy column? Keeping original structure.
-        # Original: [0, pregnancies, glucose, bp, skin, insulin, bmi, dpf, age]
-        # Wait, standard Pima Indians dataset usually has 8 cols. 
-        # The previous code passed 9 items: [0, ...]. 
-        # I will respect the legacy code's input shape.
-        make_prediction_and_display("Diabetes", input_data)
+        record = {
+            "pregnancies": pregnancies, "glucose": glucose, "bp": bp, "skin": skin,
+            "insulin": insulin, "bmi": bmi, "dpf": dpf, "age": age
+        }
+        make_prediction_and_display("Diabetes", record)
 
 
 # --- HEART ---
@@ -241,8 +178,11 @@ elif selected_disease == "Heart":
         ca = st.selectbox("Major Vessels (0-3)", [0, 1, 2, 3]) 
 
     if st.button("Predict Heart Disease"):
-        input_data = [[age, sex, cp, trestbps, chol, fbs, restecg, thalach, exang, oldpeak, slope, ca]]
-        make_prediction_and_display("Heart", input_data)
+        record = {
+            "age": age, "sex": sex, "cp": cp, "trestbps": trestbps, "chol": chol, "fbs": fbs,
+            "restecg": restecg, "thalach": thalach, "exang": exang, "oldpeak": oldpeak, "slope": slope, "ca": ca
+        }
+        make_prediction_and_display("Heart", record)
 
 
 # --- LIVER ---
@@ -264,8 +204,11 @@ elif selected_disease == "Liver":
         ag_ratio = st.number_input("A/G Ratio", 0.0, 3.0, 1.0)
 
     if st.button("Predict Liver Disease"):
-        input_data = [[age, gender, total_bil, direct_bil, alkphos, sgpt, sgot, proteins, albumin, ag_ratio]]
-        make_prediction_and_display("Liver", input_data)
+        record = {
+            "age": age, "gender": gender, "total_bil": total_bil, "direct_bil": direct_bil, "alkphos": alkphos,
+            "sgpt": sgpt, "sgot": sgot, "proteins": proteins, "albumin": albumin, "ag_ratio": ag_ratio
+        }
+        make_prediction_and_display("Liver", record)
 
 
 # --- KIDNEY ---
@@ -286,22 +229,10 @@ elif selected_disease == "Kidney":
         hemo = st.number_input("Hemoglobin", 0.0, 20.0, 15.0)
 
     if st.button("Predict Kidney Disease"):
-        # Original logic constructed a specific feature array
         try:
-            model_n_features = models["Kidney"].n_features_in_
-            features = np.zeros((1, model_n_features))
-            
-            features[0, 0] = age
-            features[0, 1] = bp
-            features[0, 2] = sg
-            features[0, 3] = al
-            features[0, 4] = su
-            features[0, 5] = rbc
-            features[0, 9] = sc 
-            features[0, 10] = hemo 
-            
-            make_prediction_and_display("Kidney", features)
-                
+            record = {"age": age, "bp": bp, "sg": sg, "al": al, "su": su, "rbc": rbc, "sc": sc, "hemo": hemo}
+            make_prediction_and_display("Kidney", record)
+
         except Exception as e:
             st.error(f"Error building input data: {e}")
 
@@ -324,19 +255,11 @@ elif selected_disease == "Hypertension":
 
     if st.button("Predict Hypertension"):
         try:
-            model_n_features = models["Hypertension"].n_features_in_
-            features = np.zeros((1, model_n_features))
-            
-            features[0, 0] = age
-            features[0, 1] = sex
-            features[0, 2] = bmi
-            features[0, 3] = chol
-            features[0, 4] = sys_bp
-            features[0, 5] = dia_bp
-            features[0, 6] = smoke
-            features[0, 12] = glucose 
-            
-            make_prediction_and_display("Hypertension", features)
+            record = {
+                "age": age, "sex": sex, "bmi": bmi, "chol": chol,
+                "sys_bp": sys_bp, "dia_bp": dia_bp, "smoke": smoke, "glucose": glucose
+            }
+            make_prediction_and_display("Hypertension", record)
 
         except Exception as e:
             st.error(f"Error building input data: {e}")
@@ -368,13 +291,89 @@ elif selected_disease == "Malaria_Pneumonia":
         fatigue = st.selectbox("Fatigue", [0, 1], format_func=lambda x: "Yes" if x==1 else "No")
 
     if st.button("Predict Condition"):
-        input_data = [[
-            high_fever, chills, vomiting, headache, 
-            sweating, muscle_pain, cough, phlegm, 
-            breathlessness, chest_pain, fast_heart_rate, fatigue
-        ]]
-        
-        make_prediction_and_display("Malaria_Pneumonia", input_data)
+        record = {
+            "high_fever": high_fever, "chills": chills, "vomiting": vomiting, "headache": headache,
+            "sweating": sweating, "muscle_pain": muscle_pain, "cough": cough, "phlegm": phlegm,
+            "breathlessness": breathlessness, "chest_pain": chest_pain, "fast_heart_rate": fast_heart_rate, "fatigue": fatigue
+        }
+        make_prediction_and_display("Malaria_Pneumonia", record)
+
+# --- FULL SCREENING ---
+elif selected_disease == SCREENING_MODE:
+    st.header("🩺 Full Health Screening")
+    st.info("Enter the values shared by all forms once; every model is evaluated at the same time.")
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        age = st.number_input("Age", 0, 120, 45)
+        sex = st.selectbox("Sex", [1, 0], format_func=lambda x: "Male" if x==1 else "Female")
+        bmi = st.number_input("BMI", 0.0, 70.0, 25.0)
+    with col2:
+        glucose = st.number_input("Glucose Level", 0, 300, 100)
+        systolic_bp = st.number_input("Systolic BP", 50, 250, 120)
+        diastolic_bp = st.number_input("Diastolic BP", 30, 150, 80)
+    with col3:
+        cholesterol = st.number_input("Cholesterol", 100, 600, 200)
+        smoker = st.selectbox("Smoker?", [0, 1], format_func=lambda x: "No" if x==0 else "Yes")
+
+    symptom_fields = [field for field, _ in inference.FEATURE_LAYOUTS["Malaria_Pneumonia"]]
+    symptoms = st.multiselect("Symptoms", symptom_fields, format_func=lambda x: x.replace("_", " ").title())
+
+    if st.button("Run Full Screening"):
+        record = {
+            "age": age, "sex": sex, "bmi": bmi, "glucose": glucose, "systolic_bp": systolic_bp,
+            "diastolic_bp": diastolic_bp, "cholesterol": cholesterol, "smoker": smoker
+        }
+        if symptoms:
+            record.update({field: int(field in symptoms) for field in symptom_fields})
+
+        with METRICS.timer("screening", disease="all"):
+            profile = screen_patient(models, record, cache=prediction_cache)
+
+        rows = [
+            {"Disease": d, "Risk": r["risk_level"], "Probability": f"{r['probability']:.0%}", "Result": r["summary"],
+             "Inputs used": f"{r['inputs_used']}/{r['inputs_total']}"}
+            for d, r in profile["results"].items()
+        ]
+        st.dataframe(rows)
+        if profile["flagged"]:
+            st.warning(f"⚠️ Elevated risk: {', '.join(profile['flagged'])}")
+            for disease in profile["flagged"]:
+                with st.expander(f"{disease}: care insights"):
+                    display_insights(disease, profile["results"][disease]["insights_level"])
+        elif profile["results"]:
+            st.success("✅ Low risk for every screened condition.")
+        if profile["skipped"]:
+            st.caption(f"Not screened (no inputs): {', '.join(profile['skipped'])}")
+        for disease, error in profile["errors"].items():
+            st.error(f"⚠️ {disease}: {error}")
+
+# --- BATCH UPLOAD ---
+elif selected_disease == BATCH_MODE:
+    st.header("📂 Batch Patient Screening")
+    st.info("Upload a CSV or Parquet file with one patient per row. Columns can use the form field names "
+            "(e.g. glucose, bmi, age) or the training column names. Every model that gets at least one of its inputs is scored; "
+            "missing inputs are filled with the training averages.")
+
+    uploaded = st.file_uploader("Patient file", type=["csv", "parquet"])
+    if uploaded is not None:
+        try:
+            patients = read_patient_table(uploaded)
+            results, skipped = score_frame(models, patients)
+
+            st.success(f"✅ Scored {len(results)} patients.")
+            if skipped:
+                st.warning(f"Skipped (missing input columns): {', '.join(skipped)}")
+
+            st.dataframe(results.head(1000))
+            st.download_button(
+                "Download Results",
+                results.to_csv(index=False).encode("utf-8"),
+                file_name="sher_batch_results.csv",
+                mime="text/csv"
+            )
+        except Exception as e:
+            st.error(f"Error scoring uploaded file: {e}")
 
 st.markdown("---")
 st.caption("Disclaimer: This AI tool is for educational purposes only.")
\ No newline at end of file
@@ -0,0 +1,137 @@
+"""
+Micro-batching of concurrent single-patient predictions.
+
+    batcher = MicroBatcher(models, executor, max_wait=0.002, max_batch=256)
+    result = await batcher.predict("Heart", record)     # same dict as inference.predict
+
+A predict_proba call on 256 rows costs little more than on one, because most of a
+single-row call is pandas/sklearn overhead rather than tree traversal. Requests for
+the same disease that arrive within max_wait seconds of the first one are therefore
+queued and evaluated together: one feature frame, one predict_proba call, and the
+results handed back to each waiting caller. A queue is flushed early once it holds
+max_batch requests. The added latency is at most max_wait plus the batch itself.
+
+If a batch fails on one bad record (e.g. a missing input for a legacy model), its
+records are evaluated one by one so only that caller gets the error.
+
+With early_exit (a delta, see early_exit.py) the batch is evaluated with
+predict_rows_anytime instead of predict_proba: rows whose risk band is settled stop
+early, and cached results are kept apart from full-forest ones.
+
+Queue depth and batches in flight are published as gauges, batch sizes as the
+sher_batch_size histogram, and the time requests spend queued as the "batch_wait" stage.
+"""
+import asyncio
+import time
+
+import inference
+from early_exit import cache_mode, predict_rows_anytime
+from instrumentation import METRICS
+from prediction_cache import model_version
+
+DEFAULT_MAX_WAIT = 0.002
+DEFAULT_MAX_BATCH = 256
+
+
+class MicroBatcher:
+    """
+    Per-disease request queues on one event loop, evaluated in an executor.
+    """
+
+    def __init__(self, models, executor=None, max_wait=DEFAULT_MAX_WAIT, max_batch=DEFAULT_MAX_BATCH, cache=None,
+                 early_exit=None):
+        self.models = models
+        self.executor = executor
+        self.max_wait = max_wait
+        self.max_batch = max_batch
+        self.cache = cache
+        self.early_exit = early_exit
+        self._queues = {}   # disease -> [(record, future, enqueued_at)]
+        self._timers = {}   # disease -> asyncio.TimerHandle
+
+    async def predict(self, disease, record):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        queue = self._queues.setdefault(disease, [])
+        queue.append((record, future, time.perf_counter()))
+        METRICS.set("sher_batch_queue_depth", len(queue), disease=disease)
+        if len(queue) >= self.max_batch:
+            self._flush(disease)
+        elif disease not in self._timers:
+            self._timers[disease] = loop.call_later(self.max_wait, self._flush, disease)
+        return await future
+
+    def _flush(self, disease):
+        timer = self._timers.pop(disease, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._queues.pop(disease, [])
+        METRICS.set("sher_batch_queue_depth", 0, disease=disease)
+        if not batch:
+            return
+
+        now = time.perf_counter()
+        for _, _, enqueued_at in batch:
+            METRICS.observe("sher_stage_seconds", now - enqueued_at, stage="batch_wait", disease=disease)
+        METRICS.observe("sher_batch_size", len(batch), disease=disease)
+        METRICS.add("sher_batch_inflight", 1, disease=disease)
+
+        records = [record for record, _, _ in batch]
+        task = asyncio.get_running_loop().run_in_executor(self.executor, self.run_batch, disease, records)
+        task.add_done_callback(lambda t: self._deliver(disease, batch, t))
+
+    @staticmethod
+    def _deliver(disease, batch, task):
+        METRICS.add("sher_batch_inflight", -1, disease=disease)
+        error = task.exception() if not task.cancelled() else asyncio.CancelledError()
+        for i, (_, future, _) in enumerate(batch):
+            if future.done():
+                continue  # caller went away
+            outcome = error if error is not None else task.result()[i]
+            if isinstance(outcome, BaseException):
+                future.set_exception(outcome)
+            else:
+                future.set_result(outcome)
+
+    # ------------------------------------------
+    # Runs in the executor
+    # ------------------------------------------
+    def run_batch(self, disease, records):
+        """
+        Results for records, in order. An entry is the exception for a record that
+        could not be evaluated; a missing model fails the whole batch.
+        """
+        model = self.models[disease]
+        try:
+            return self._evaluate(disease, model, records)
+        except (TypeError, ValueError) as e:
+            if len(records) == 1:
+                return [e]
+        results = []
+        for record in records:
+            try:
+                results.append(self._evaluate(disease, model, [record])[0])
+            except (TypeError, ValueError) as e:
+                results.append(e)
+        return results
+
+    def _predict_rows(self, disease, model, features):
+        if self.early_exit:
+            return predict_rows_anytime(disease, model, features, self.early_exit)
+        return inference.predict_rows(disease, model, features)
+
+    def _evaluate(self, disease, model, records):
+        with METRICS.timer("batch_features", disease=disease):
+            features = inference.build_feature_rows(disease, model, records)
+        if self.cache is None:
+            return self._predict_rows(disease, model, features)
+
+        results, keys = self.cache.lookup_rows(disease, model, features, model_version(self.models, disease),
+                                               cache_mode(self.early_exit))
+        todo = [i for i, r in enumerate(results) if r is None]
+        if todo:
+            rows = features.iloc[todo] if hasattr(features, "iloc") else features[todo]
+            for i, result in zip(todo, self._predict_rows(disease, model, rows)):
+                self.cache.store(keys[i], result)
+                results[i] = dict(result)
+        return results
@@ -0,0 +1,297 @@
+"""
+Latency and throughput benchmark of every disease model.
+Usage: python benchmark_inference.py [--model-dir .] [--diseases Heart Kidney] [--out bench.json]
+       python benchmark_inference.py --baseline bench_before.json [--tolerance 0.10] [--latency-tolerance 0.50]
+
+For each model this measures, on the file load_model_file() actually reads (the
+first export of --model-formats that is not older than the .sav, see
+inference.model_artifact; recorded as "file" and "artifact"):
+- cold load:  load_model_file() in a fresh Python process (imports excluded), median of 3
+- single row: p50/p95/p99 of build_features + predict, the path behind every app form
+- batches:    rows/s of score_frame (the upload and /predict/batch path) at 1, 64, 1k, 100k rows
+- peak RSS:   resident memory high-water mark while the model is benchmarked
+
+Inputs are random form values drawn from a seeded generator (0/1 for symptoms,
+0-100 otherwise), a different row for every call. Every model is measured --repeats
+times, in rounds over all models so that the repeats are spread over the whole run,
+and the median of each metric is kept. Results are printed and
+written as JSON. With --baseline the run is compared metric by metric against an
+earlier JSON; any metric worse by more than its tolerance is reported and the exit
+code is 1. Load time, single-row latency and batches under 1k rows take a few
+milliseconds at most and vary a lot between runs, so they get --latency-tolerance;
+everything else gets --tolerance.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import sklearn
+
+import inference
+from compact_forest import compact_path
+from inference import (MODEL_FILES, MODEL_FORMATS, build_features, load_model_file, model_artifact, parse_formats,
+                       sample_inputs, score_frame)
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BATCH_SIZES = [1, 64, 1000, 100_000]
+# (metric, True when higher is better, True when compared with --latency-tolerance)
+METRICS = [("cold_load_s", False, True), ("p50_ms", False, True), ("p95_ms", False, True), ("p99_ms", False, True),
+           ("peak_rss_mb", False, False)]
+SMALL_BATCH = 1000  # rows_per_s below this batch size is compared with --latency-tolerance
+MIN_TIMING_S = 0.2  # each batch measurement repeats score_frame for at least this long
+
+# ==========================================
+# 1. MEASUREMENT HELPERS
+# ==========================================
+def _reset_peak_rss():
+    # Linux: writing 5 to clear_refs resets VmHWM, so every model gets its own peak
+    try:
+        with open("/proc/self/clear_refs", "w") as fh:
+            fh.write("5")
+    except OSError:
+        pass
+
+def peak_rss_mb():
+    try:
+        with open("/proc/self/status", encoding="ascii") as fh:
+            for line in fh:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is not None:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return None
+
+def cold_load(path, runs=3, formats=MODEL_FORMATS):
+    """
+    Median seconds to load path in a new interpreter, after inference.py is imported.
+    """
+    times = []
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--cold-load", path, "--model-formats", ",".join(formats) or "pickle"],
+            capture_output=True, text=True, check=True
+        )
+        times.append(json.loads(proc.stdout.strip().splitlines()[-1])["cold_load_s"])
+    return float(np.median(times))
+
+def artifact_kind(path, artifact):
+    if artifact == compact_path(path):
+        return "compact"
+    return "arrays" if artifact != path else "pickle"
+
+def batch_rate(model_name, model, frame):
+    """
+    Rows/s of score_frame on frame, timed over enough calls to last MIN_TIMING_S.
+    """
+    calls, elapsed = 0, 0.0
+    while elapsed < MIN_TIMING_S or not calls:
+        start = time.perf_counter()
+        score_frame({model_name: model}, frame)
+        elapsed += time.perf_counter() - start
+        calls += 1
+    return len(frame) * calls / elapsed
+
+# ==========================================
+# 2. BENCHMARK ONE MODEL
+# ==========================================
+def benchmark_model(name, path, iterations=1000, batch_sizes=BATCH_SIZES, seed=0, formats=MODEL_FORMATS):
+    _reset_peak_rss()
+    artifact = model_artifact(path, formats)
+    result = {"file": artifact, "artifact": artifact_kind(path, artifact), "format": None}
+    result["cold_load_s"] = cold_load(path, formats=formats)
+
+    model = load_model_file(path, formats)
+    result["format"] = type(model).__name__
+
+    # Single row: the app's form path, a new patient every call
+    records = sample_inputs(name, model, iterations, seed).to_dict("records")
+    for record in records[:20]:
+        inference.predict(name, model, build_features(name, model, record))
+    latencies = np.empty(len(records))
+    for i, record in enumerate(records):
+        start = time.perf_counter()
+        inference.predict(name, model, build_features(name, model, record))
+        latencies[i] = time.perf_counter() - start
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    result.update({"p50_ms": p50, "p95_ms": p95, "p99_ms": p99})
+
+    # Batches: score_frame on n rows, after one warm-up call
+    throughput = {}
+    for n in batch_sizes:
+        frame = sample_inputs(name, model, n, seed + 1)
+        score_frame({name: model}, frame)
+        throughput[str(n)] = batch_rate(name, model, frame)
+    result["rows_per_s"] = throughput
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+def median_result(runs):
+    """
+    The median of every metric over repeated benchmark_model results of one model.
+    """
+    result = dict(runs[0])
+    for metric, _, _ in METRICS:
+        values = [r[metric] for r in runs if r.get(metric) is not None]
+        result[metric] = float(np.median(values)) if values else None
+    result["rows_per_s"] = {n: float(np.median([r["rows_per_s"][n] for r in runs])) for n in runs[0]["rows_per_s"]}
+    return result
+
+# ==========================================
+# 3. BASELINE COMPARISON
+# ==========================================
+def flatten(results):
+    """
+    {(disease, metric): (value, higher_is_better, latency)} for every comparable number.
+    """
+    flat = {}
+    for disease, r in results["models"].items():
+        for metric, higher, latency in METRICS:
+            if r.get(metric) is not None:
+                flat[(disease, metric)] = (r[metric], higher, latency)
+        for n, value in r.get("rows_per_s", {}).items():
+            flat[(disease, f"rows_per_s@{n}")] = (value, True, int(n) < SMALL_BATCH)
+    return flat
+
+def compare(current, baseline, tolerance, latency_tolerance=None):
+    """
+    Rows of (disease, metric, baseline, current, change, regressed) for metrics in both runs.
+    change is relative and signed so that positive means better.
+    """
+    if latency_tolerance is None:
+        latency_tolerance = tolerance
+    old, new = flatten(baseline), flatten(current)
+    rows = []
+    for key in new:
+        if key not in old or not old[key][0]:
+            continue
+        (before, higher, latency), after = old[key], new[key][0]
+        change = (after - before) / before
+        if not higher:
+            change = -change
+        rows.append((*key, before, after, change, change < -(latency_tolerance if latency else tolerance)))
+    return rows
+
+def changed_artifacts(current, baseline):
+    """
+    {disease: (baseline file, current file)} for models loaded from a different file.
+    """
+    changed = {}
+    for disease, r in current["models"].items():
+        before = baseline["models"].get(disease, {}).get("file")
+        if before is not None and os.path.basename(before) != os.path.basename(r["file"]):
+            changed[disease] = (before, r["file"])
+    return changed
+
+def print_results(results):
+    sizes = list(next(iter(results["models"].values()))["rows_per_s"]) if results["models"] else []
+    header = f"{'Disease':<20}{'load s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+    header += "".join(f"{'rows/s@' + n:>15}" for n in sizes) + f"{'peak MB':>9}"
+    print(header)
+    print("-" * len(header))
+    for disease, r in results["models"].items():
+        line = f"{disease:<20}{r['cold_load_s']:>8.3f}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['p99_ms']:>9.2f}"
+        line += "".join(f"{r['rows_per_s'][n]:>15,.0f}" for n in sizes)
+        peak = f"{r['peak_rss_mb']:.0f}" if r["peak_rss_mb"] is not None else "-"
+        print(line + f"{peak:>9}")
+
+# ==========================================
+# 4. MAIN
+# ==========================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark load time, latency and throughput of the disease models.")
+    parser.add_argument("--model-dir", default=".", help="Folder containing the model_<Disease>.sav files")
+    parser.add_argument("--diseases", nargs="+", help="Models to benchmark (default: every model found)")
+    parser.add_argument("--iterations", type=int, default=1000, help="Single-row predictions per model")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=BATCH_SIZES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeats", type=int, default=3, help="Measurements per metric; the median is kept")
+    parser.add_argument("--out", default="benchmark_inference.json", help="Where to write the JSON results")
+    parser.add_argument("--baseline", help="Earlier results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="Relative slowdown allowed before a metric counts as a regression (default: 0.10)")
+    parser.add_argument("--latency-tolerance", type=float, default=0.50,
+                        help="The same for load time, single-row latency and batches under 1k rows (default: 0.50)")
+    parser.add_argument("--model-formats", type=parse_formats, default=MODEL_FORMATS,
+                        help="Exports to load instead of the .sav, in order (default: arrays,compact; pickle: the .sav)")
+    parser.add_argument("--cold-load", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.cold_load:
+        start = time.perf_counter()
+        load_model_file(args.cold_load, args.model_formats)
+        print(json.dumps({"cold_load_s": time.perf_counter() - start}))
+        return 0
+
+    diseases = args.diseases or list(MODEL_FILES)
+    results = {
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "machine": {
+            "python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+            "numpy": np.__version__, "pandas": pd.__version__, "sklearn": sklearn.__version__
+        },
+        "settings": {"iterations": args.iterations, "batch_sizes": args.batch_sizes, "seed": args.seed,
+                     "repeats": args.repeats},
+        "models": {}
+    }
+
+    print("🚀 Benchmarking models...")
+    paths = {}
+    for disease in diseases:
+        path = os.path.join(args.model_dir, MODEL_FILES.get(disease, f"model_{disease}.sav"))
+        if not os.path.exists(model_artifact(path, args.model_formats)):
+            print(f"⏭️ {disease}: {path} not found")
+            continue
+        paths[disease] = path
+    runs = {disease: [] for disease in paths}
+    for _ in range(args.repeats):
+        for disease, path in paths.items():
+            if runs.get(disease) is None:
+                continue
+            try:
+                runs[disease].append(benchmark_model(disease, path, args.iterations, args.batch_sizes, args.seed,
+                                                       args.model_formats))
+            except Exception as e:
+                print(f"❌ {disease}: {e}")
+                runs[disease] = None
+    results["models"] = {disease: median_result(r) for disease, r in runs.items() if r}
+
+    print()
+    print_results(results)
+    with open(args.out, "w", encoding="utf-8") as fh:
+        json.dump(results, fh, indent=2)
+    print(f"\n✅ Results written to {args.out}")
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline, encoding="utf-8") as fh:
+        baseline = json.load(fh)
+    rows = compare(results, baseline, args.tolerance, args.latency_tolerance)
+    regressions = [r for r in rows if r[5]]
+    print(f"\nCompared with {args.baseline} (tolerance {args.tolerance:.0%}, latency {args.latency_tolerance:.0%}):")
+    for disease, (before, after) in changed_artifacts(results, baseline).items():
+        print(f"  ℹ️ {disease}: loaded from {after}, baseline from {before}")
+    for disease, metric, before, after, change, regressed in rows:
+        if regressed or change > args.tolerance:
+            marker = "❌ worse " if regressed else "✅ better"
+            print(f"  {marker}  {disease:<20}{metric:<22}{before:>14.4g} -> {after:<14.4g}({change:+.0%})")
+    if regressions:
+        print(f"⚠️ {len(regressions)} metric(s) regressed beyond their tolerance")
+        return 1
+    print("🎉 No regressions.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
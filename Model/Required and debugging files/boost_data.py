@@ -1,5 +1,6 @@
 import pandas as pd
 import numpy as np
+from oversample import smote
 
 # 1. Load your original data
 input_file = "datasets/SHER_Malaria_Pneumonia.csv"
@@ -23,7 +24,7 @@ if len(df_filtered) == 0:
     exit()
 
 # 3. Define a function to generate fake data (Smart Mode)
-def generate_synthetic_data(existing_df, target_disease, num_samples=500):
+def generate_synthetic_data(existing_df, target_disease, num_samples=500, seed=None):
     # Get only the rows for this specific disease
     subset = existing_df[existing_df[target_col].astype(str).str.contains(target_disease, case=False)]
     
@@ -33,32 +34,12 @@ def generate_synthetic_data(existing_df, target_disease, num_samples=500):
     
     # We only create fake data for Numeric columns (Age, BP, Symptoms)
     numeric_cols = subset.select_dtypes(include=[np.number]).columns
-    new_data = pd.DataFrame()
     
-    for col in numeric_cols:
-        # CHECK: Is this a continuous value (like Age) or a binary symptom (0/1)?
-        max_val = subset[col].max()
-        
-        if max_val > 1.5:  
-            # --- CONTINUOUS VARIABLE (Age, BP, Glucose) ---
-            # We generate random numbers based on the Mean and Standard Deviation
-            mean = subset[col].mean()
-            std = subset[col].std()
-            if np.isnan(std) or std == 0: std = 1  # prevent crash if all values are identical
-            
-            # Generate random values
-            values = np.random.normal(mean, std, num_samples)
-            new_data[col] = np.abs(values) # Ensure no negative ages
-            
-        else:
-            # --- BINARY SYMPTOM (0 or 1) ---
-            # We treat the mean as the "probability of having the symptom"
-            prob = subset[col].mean()
-            
-            # Safety Clamp: Ensure probability is strictly between 0.0 and 1.0
-            prob = max(0.0, min(1.0, prob))
-            
-            new_data[col] = np.random.choice([0, 1], size=num_samples, p=[1-prob, prob])
+    # Every new patient is built between a real patient and one of their nearest
+    # neighbours (SMOTE, see oversample.py), so symptoms that occur together in the
+    # real data still occur together in the synthetic rows
+    labels = pd.Series(target_disease, index=subset.index)
+    new_data, _ = smote(subset[numeric_cols], labels, {target_disease: num_samples}, seed=seed)
         
     # Add the target label back
     new_data[target_col] = target_disease
@@ -66,8 +47,8 @@ def generate_synthetic_data(existing_df, target_disease, num_samples=500):
 
 # 4. Generate 500 Malaria and 500 Pneumonia cases
 print("🚀 Generating synthetic patients...")
-synthetic_malaria = generate_synthetic_data(df_filtered, "Malaria", 500)
-synthetic_pneumonia = generate_synthetic_data(df_filtered, "Pneumonia", 500)
+synthetic_malaria = generate_synthetic_data(df_filtered, "Malaria", 500, seed=42)
+synthetic_pneumonia = generate_synthetic_data(df_filtered, "Pneumonia", 500, seed=43)
 
 # 5. Combine and Save
 final_df = pd.concat([synthetic_malaria, synthetic_pneumonia])
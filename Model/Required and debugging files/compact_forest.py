@@ -0,0 +1,371 @@
+"""
+Compact, quantized single-file forest format, loaded without pickle.
+Usage: python compact_forest.py model_Diabetes.sav [model_Heart.sav ...] [--leaf-bits 16] [--check]
+
+A .sav stores every node of every tree as float64 thresholds, int64 node indices
+and float64 class counts, plus the impurity and sample counts that are only needed
+for training, and loading it means unpickling sklearn objects. model_<Disease>.sherbin
+stores only what prediction reads:
+
+    tree_sizes     int32         nodes per tree
+    right          int16/int32   right child of every node within its tree, 0 for leaves
+    left           int16/int32   left child, only when it is not the next node (sklearn's
+                                 depth-first builder always puts it there)
+    feature        uint8/int16   feature tested, split nodes only
+    threshold      float32       rounded down (see below), split nodes only
+    value          uint8/uint16  class probabilities in fixed point, leaves only, without
+                                 the last class (1 minus the others)
+    missing_left   bits          where NaN inputs go, only when any node sends them left
+
+The file is an 8-byte magic, a little-endian uint32 header length, a JSON header
+(classes, feature names, array offsets and dtypes, and the fitted preprocessing as
+plain numbers: imputation values and category lists) and the raw arrays.
+load_compact() slices them out of the file with np.frombuffer, rebuilds the full node
+arrays with a few vectorized operations and returns a FlatForest (see forest_arrays.py),
+so nothing is unpickled and no sklearn import is needed.
+
+Accuracy:
+- thresholds: sklearn compares float32 inputs against float64 thresholds. Each
+  threshold is stored as the largest float32 not above it, which sends every float32
+  input the same way, so every tree reaches exactly the same leaf as in sklearn.
+- leaf probabilities: rounded to multiples of 1 / (2**bits - 1). The forest average
+  is off by at most 0.5 / (2**bits - 1) per class (K - 1 times that for the derived
+  last class of a K-class model): 7.7e-6 for 16 bits, 0.002 for 8 bits. A
+  probability closer than that to a band edge (0.4, 0.7) can land in the other band.
+
+Only the preprocessing that trainmodels.py builds can be stored (a ColumnTransformer
+of SimpleImputer, OrdinalEncoder and passthrough columns); other models raise ValueError.
+"""
+import argparse
+import json
+import os
+import struct
+import time
+
+import numpy as np
+import pandas as pd
+
+from forest_arrays import FlatForest, flatten_forest, split_pipeline
+
+MAGIC = b"SHERFRST"
+FORMAT_VERSION = 1
+COMPACT_EXTENSION = ".sherbin"
+DEFAULT_LEAF_BITS = 16
+ALIGNMENT = 16
+
+
+def compact_path(path):
+    """
+    model_<Disease>.sherbin next to model_<Disease>.sav.
+    """
+    return os.path.splitext(path)[0] + COMPACT_EXTENSION
+
+
+def _index_dtype(n):
+    return np.dtype("<i2") if n <= np.iinfo(np.int16).max else np.dtype("<i4")
+
+
+# ==========================================
+# 1. PREPROCESSING WITHOUT PICKLE
+# ==========================================
+class ColumnPlan:
+    """
+    The fitted preprocessing of a trainmodels.py Pipeline as plain data.
+
+    blocks is a list of {"columns": [...], "fill": [...] or None, "categories": [...] or None}
+    in output order: fill replaces missing values column by column, categories maps
+    each value to its position (unknown values -> -1) as OrdinalEncoder does.
+    """
+
+    def __init__(self, feature_names, blocks):
+        self.feature_names_in_ = np.asarray(feature_names, dtype=object)
+        self.n_features_in_ = len(feature_names)
+        self.blocks = blocks
+        self._codes = [
+            [{value: i for i, value in enumerate(values)} for values in block["categories"]] if block["categories"] else None
+            for block in blocks
+        ]
+
+    @classmethod
+    def from_sklearn(cls, preprocess):
+        transformer = preprocess
+        while len(getattr(transformer, "steps", ())) == 1:
+            transformer = transformer.steps[0][1]
+        if type(transformer).__name__ != "ColumnTransformer":
+            raise ValueError(f"Cannot store {type(transformer).__name__} preprocessing without pickle")
+
+        names = [str(c) for c in transformer.feature_names_in_]
+        blocks = []
+        for _, step, columns in transformer.transformers_:
+            columns = [names[c] if isinstance(c, (int, np.integer)) else str(c) for c in np.atleast_1d(columns)]
+            if not columns or (isinstance(step, str) and step == "drop"):
+                continue
+            if isinstance(step, str) and step == "passthrough":
+                blocks.append({"columns": columns, "fill": None, "categories": None})
+                continue
+            parts = [s for _, s in step.steps] if hasattr(step, "steps") else [step]
+            block = {"columns": columns, "fill": None, "categories": None}
+            for part in parts:
+                kind = type(part).__name__
+                if kind == "SimpleImputer":
+                    block["fill"] = _imputer_fill(part)
+                elif kind == "OrdinalEncoder" and _encodes_unknown_as_minus_one(part):
+                    block["categories"] = [np.asarray(c).tolist() for c in part.categories_]
+                elif kind == "FunctionTransformer" and part.func is None:
+                    pass   # remainder="passthrough" in recent sklearn
+                else:
+                    raise ValueError(f"Cannot store {kind} preprocessing without pickle")
+            blocks.append(block)
+        return cls(names, blocks)
+
+    def to_dict(self):
+        return {"feature_names": self.feature_names_in_.tolist(), "blocks": self.blocks}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["feature_names"], data["blocks"])
+
+    def transform(self, X):
+        if not isinstance(X, pd.DataFrame):
+            X = pd.DataFrame(np.asarray(X, dtype=object).reshape(len(X), -1), columns=self.feature_names_in_)
+        out = []
+        for block, codes in zip(self.blocks, self._codes):
+            frame = X[block["columns"]]
+            if codes is None:
+                values = frame.to_numpy(dtype=np.float64, na_value=np.nan)
+                if block["fill"] is not None:
+                    values = np.where(np.isnan(values), np.asarray(block["fill"], dtype=np.float64), values)
+                out.append(values)
+                continue
+            encoded = np.empty(frame.shape, dtype=np.float64)
+            for j, (column, mapping) in enumerate(zip(block["columns"], codes)):
+                values = frame[column].astype(object)
+                if block["fill"] is not None:
+                    values = values.where(values.notna(), block["fill"][j])
+                encoded[:, j] = [mapping.get(v, -1) for v in values]
+            out.append(encoded)
+        return np.hstack(out) if out else np.empty((len(X), 0))
+
+
+def _imputer_fill(imputer):
+    if not (isinstance(imputer.missing_values, float) and np.isnan(imputer.missing_values)):
+        raise ValueError("Only SimpleImputer(missing_values=np.nan) can be stored without pickle")
+    statistics = np.asarray(imputer.statistics_)
+    if statistics.dtype.kind == "f":
+        if np.isnan(statistics).any() and not imputer.keep_empty_features:
+            raise ValueError("SimpleImputer drops empty columns; refit with keep_empty_features=True")
+        return np.where(np.isnan(statistics), 0.0, statistics).tolist()
+    return statistics.tolist()
+
+
+def _encodes_unknown_as_minus_one(encoder):
+    return encoder.handle_unknown == "use_encoded_value" and encoder.unknown_value == -1
+
+
+# ==========================================
+# 2. EXPORT
+# ==========================================
+def float32_floor(values):
+    """
+    The largest float32 not above each float64 value (inf stays inf).
+    """
+    rounded = values.astype(np.float32)
+    above = rounded.astype(np.float64) > values
+    rounded[above] = np.nextafter(rounded[above], np.float32(-np.inf))
+    return rounded
+
+
+def quantize_values(value, bits=DEFAULT_LEAF_BITS):
+    """
+    Class probabilities (n_nodes, n_classes) as fixed point, without the last class.
+    """
+    if bits not in (8, 16):
+        raise ValueError("leaf_bits must be 8 or 16")
+    scale = (1 << bits) - 1
+    dtype = np.dtype("<u1") if bits == 8 else np.dtype("<u2")
+    return np.rint(value[:, :-1] * scale).astype(dtype), scale
+
+
+def compact_arrays(model, leaf_bits=DEFAULT_LEAF_BITS):
+    """
+    (arrays, meta) of the compact format for a fitted forest or Pipeline.
+    """
+    preprocess, forest = split_pipeline(model)
+    flat, max_depth = flatten_forest(forest)
+    n_nodes = len(flat["feature"])
+    ids = np.arange(n_nodes)
+    sizes = np.diff(np.append(flat["roots"], n_nodes))
+    root_of = np.repeat(flat["roots"], sizes)
+    right, left = flat["children"][:, 0], flat["children"][:, 1]
+    split = right != ids   # leaves point to themselves
+    local = _index_dtype(int(sizes.max()))
+    value, scale = quantize_values(flat["value"][~split], leaf_bits)
+    n_features = int(forest.n_features_in_)
+    feature_dtype = np.dtype("u1") if n_features <= np.iinfo(np.uint8).max else _index_dtype(n_features)
+
+    # A child index of 0 (a root) never occurs, so it marks leaves
+    arrays = {
+        "tree_sizes": sizes.astype("<i4"),
+        "right": np.where(split, right - root_of, 0).astype(local),
+        "feature": flat["feature"][split].astype(feature_dtype),
+        "threshold": float32_floor(flat["threshold"][split]).astype("<f4"),
+        "value": value
+    }
+    # sklearn's depth-first builder puts the left child right after its parent
+    if not np.array_equal(left[split], ids[split] + 1):
+        arrays["left"] = np.where(split, left - root_of, 0).astype(local)
+    if flat["missing_left"][split].any():
+        arrays["missing_left"] = np.packbits(flat["missing_left"][split])
+
+    meta = {
+        "format_version": FORMAT_VERSION,
+        "classes": np.asarray(forest.classes_).tolist(),
+        "n_features_in": n_features,
+        "feature_names_in": [str(c) for c in getattr(model, "feature_names_in_", [])],
+        "max_depth": int(max_depth),
+        "n_nodes": n_nodes,
+        "leaf_scale": scale,
+        "preprocess": ColumnPlan.from_sklearn(preprocess).to_dict() if preprocess is not None else None
+    }
+    return arrays, meta
+
+
+def save_compact(model, path, leaf_bits=DEFAULT_LEAF_BITS):
+    """
+    Write a fitted forest (or trainmodels.py Pipeline) as one .sherbin file.
+    """
+    arrays, meta = compact_arrays(model, leaf_bits)
+    offset = 0
+    meta["arrays"] = {}
+    for name, arr in arrays.items():
+        meta["arrays"][name] = {"dtype": arr.dtype.str, "shape": list(arr.shape), "offset": offset}
+        offset += -(-arr.nbytes // ALIGNMENT) * ALIGNMENT
+
+    header = json.dumps(meta, separators=(",", ":")).encode("utf-8")
+    header += b" " * (-(len(MAGIC) + 4 + len(header)) % ALIGNMENT)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as fh:
+        fh.write(MAGIC + struct.pack("<I", len(header)) + header)
+        for arr in arrays.values():
+            data = np.ascontiguousarray(arr).tobytes()
+            fh.write(data + b"\0" * (-len(data) % ALIGNMENT))
+    os.replace(tmp, path)
+    return path
+
+
+# ==========================================
+# 3. LOAD
+# ==========================================
+def load_compact(path):
+    """
+    FlatForest from a .sherbin file, using np.frombuffer and JSON only.
+    """
+    with open(path, "rb") as fh:
+        data = fh.read()
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not a compact forest file")
+    (header_len,) = struct.unpack_from("<I", data, len(MAGIC))
+    start = len(MAGIC) + 4
+    meta = json.loads(data[start:start + header_len])
+    if meta.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"{path} was written by another version of compact_forest.py; re-export it from the .sav")
+    base = start + header_len
+
+    raw = {}
+    for name, spec in meta["arrays"].items():
+        dtype = np.dtype(spec["dtype"])
+        count = int(np.prod(spec["shape"]))
+        raw[name] = np.frombuffer(data, dtype=dtype, count=count, offset=base + spec["offset"]).reshape(spec["shape"])
+
+    # Rebuild the node arrays FlatForest walks, at the widths it indexes and averages with
+    n_nodes = meta["n_nodes"]
+    ids = np.arange(n_nodes)
+    sizes = raw["tree_sizes"].astype(np.intp)
+    roots = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.intp)
+    splits = np.flatnonzero(raw["right"])   # integer indices: much faster than boolean masks here
+    leaves = np.flatnonzero(raw["right"] == 0)
+    split_roots = np.repeat(roots, sizes)[splits]
+
+    children = np.repeat(ids[:, None], 2, axis=1)
+    children[splits, 0] = raw["right"][splits] + split_roots
+    children[splits, 1] = raw["left"][splits] + split_roots if "left" in raw else splits + 1
+    feature = np.zeros(n_nodes, dtype=np.int16 if raw["feature"].dtype.itemsize <= 2 else np.int32)
+    feature[splits] = raw["feature"]
+    threshold = np.full(n_nodes, np.inf)
+    threshold[splits] = raw["threshold"]
+    missing_left = np.zeros(n_nodes, dtype=bool)
+    if "missing_left" in raw:
+        missing_left[splits] = np.unpackbits(raw["missing_left"], count=len(splits)).astype(bool)
+
+    partial = raw["value"] / meta["leaf_scale"]
+    value = np.zeros((n_nodes, partial.shape[1] + 1))
+    value[leaves, :-1] = partial
+    value[leaves, -1] = np.clip(1.0 - partial.sum(axis=1), 0.0, 1.0)
+
+    arrays = {"feature": feature, "threshold": threshold, "children": children,
+              "value": value, "missing_left": missing_left, "roots": roots}
+    preprocess = ColumnPlan.from_dict(meta["preprocess"]) if meta["preprocess"] else None
+    return FlatForest(arrays, meta, preprocess)
+
+
+# ==========================================
+# 4. CHECK
+# ==========================================
+def check_export(disease, model, path, n_rows=2000, seed=0):
+    """
+    Sizes, load times and the largest probability difference of a compact export
+    against the model it was written from, on random form inputs.
+    """
+    import joblib
+    import inference
+
+    sav_path = os.path.splitext(path)[0] + ".sav"
+    compact = load_compact(path)
+    records = inference.sample_inputs(disease, model, n_rows, seed).to_dict("records")
+    X = inference.build_feature_rows(disease, model, records)
+    diff = np.abs(model.predict_proba(X) - compact.predict_proba(X))
+    levels = [inference.get_risk_levels(inference.disease_probabilities(disease, m.classes_, m.predict_proba(X))[1])
+              for m in (model, compact)]
+
+    def best_of(load, runs=5):
+        times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            load()
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    return {
+        "sav_bytes": os.path.getsize(sav_path) if os.path.exists(sav_path) else None,
+        "compact_bytes": os.path.getsize(path),
+        "sav_load_ms": best_of(lambda: joblib.load(sav_path)) * 1000 if os.path.exists(sav_path) else None,
+        "compact_load_ms": best_of(lambda: load_compact(path)) * 1000,
+        "max_abs_diff": float(diff.max()),
+        "same_band": float(np.mean(levels[0] == levels[1]))
+    }
+
+
+if __name__ == "__main__":
+    import joblib
+
+    parser = argparse.ArgumentParser(description="Export trained models in the compact .sherbin format.")
+    parser.add_argument("models", nargs="+", help="model_<Disease>.sav files")
+    parser.add_argument("--leaf-bits", type=int, choices=(8, 16), default=DEFAULT_LEAF_BITS,
+                        help="Fixed-point width of leaf probabilities")
+    parser.add_argument("--check", action="store_true", help="Compare size, load time and probabilities with the .sav")
+    args = parser.parse_args()
+
+    for path in args.models:
+        model = joblib.load(path)
+        try:
+            target = save_compact(model, compact_path(path), args.leaf_bits)
+        except ValueError as e:
+            print(f"❌ {path}: {e}")
+            continue
+        print(f"✅ {path} -> {target}")
+        if args.check:
+            disease = os.path.splitext(os.path.basename(path))[0].removeprefix("model_")
+            r = check_export(disease, model, target)
+            print(f"   {r['sav_bytes'] / 1024:.0f} KB -> {r['compact_bytes'] / 1024:.0f} KB, "
+                  f"load {r['sav_load_ms']:.1f} -> {r['compact_load_ms']:.2f} ms, "
+                  f"max |dp| {r['max_abs_diff']:.2e}, same band {r['same_band']:.2%}")
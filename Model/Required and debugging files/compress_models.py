@@ -0,0 +1,279 @@
+"""
+Post-training forest compression.
+Usage: python compress_models.py [--model-dir .] [--diseases Liver Diabetes] [--tolerance 0.01] [--out-dir compressed]
+
+The models from trainmodels.py are 100 fully grown trees, which makes them several
+MB each and sets the cost of every prediction. This script searches for a smaller
+forest that scores almost as well on the spec's held-out split:
+
+- subset      the first n trees of the trained forest (no refit)
+- pruned      refits with fewer trees, a depth cap and leaf merging, either
+              min_samples_leaf or minimal cost-complexity pruning (ccp_alpha),
+              which collapses subtrees that barely reduce impurity into one leaf
+- distilled   small forests fitted to the trained forest's own predictions on the
+              training rows plus jittered copies of them, so the student learns
+              the teacher's decision surface rather than the noisy labels
+
+Every candidate reuses the trained model's fitted preprocessing and is scored on the
+held-out rows for accuracy and ROC AUC, size (.sav and array export) and single-row
+latency (sklearn Pipeline and FlatForest). The smallest candidate whose accuracy and
+AUC are both within --tolerance of the original is written to --out-dir as
+model_<Disease>.sav with its memory-mappable and compact exports; the original itself qualifies,
+so a model is never made worse. All candidates, with the size/accuracy Pareto front
+marked, go to <out-dir>/compression_report.json.
+
+Serve the result with `serve.py --model-dir compressed` or register it with --registry.
+"""
+import argparse
+import copy
+import io
+import json
+import os
+import time
+
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score, roc_auc_score
+from sklearn.pipeline import Pipeline
+
+from compact_forest import compact_path, save_compact
+from forest_arrays import compile_forest, flatten_forest, save_forest, split_pipeline
+
+DEFAULT_TOLERANCE = 0.01
+SUBSET_SIZES = (5, 10, 20, 30, 50, 75)
+TREE_COUNTS = (10, 25, 50, 100)
+DEPTH_CAPS = (None, 12, 8, 5)
+LEAF_MERGING = ({}, {"min_samples_leaf": 10}, {"ccp_alpha": 0.002})
+DISTILL_GRID = [(10, 8), (10, 12), (25, 8), (25, 12), (25, None)]
+DISTILL_COPIES = 3
+DISTILL_NOISE = 0.05   # jitter, as a fraction of each column's standard deviation
+LATENCY_ROWS = 50
+
+
+# ==========================================
+# 1. CANDIDATES
+# ==========================================
+def tree_subset(forest, n_trees):
+    """
+    Shallow copy of a fitted forest keeping only its first n_trees trees.
+    """
+    subset = copy.copy(forest)
+    subset.estimators_ = forest.estimators_[:n_trees]
+    subset.n_estimators = n_trees
+    return subset
+
+
+def candidate_forests(forest, X_train, y_train, estimator_params, n_jobs=1, seed=0):
+    """
+    Yield (name, settings, fitted forest) for every compressed variant of forest.
+    X_train is already preprocessed.
+    """
+    for n in SUBSET_SIZES:
+        if n < len(forest.estimators_):
+            yield f"subset-{n}", {"n_estimators": n}, tree_subset(forest, n)
+
+    base = {k: v for k, v in estimator_params.items() if k not in ("n_estimators", "max_depth", "min_samples_leaf", "ccp_alpha")}
+    original = (len(forest.estimators_), estimator_params.get("max_depth"))
+    for n in TREE_COUNTS:
+        for depth in DEPTH_CAPS:
+            for merging in LEAF_MERGING:
+                if (n, depth) == original and not merging:
+                    continue   # the trained forest itself
+                settings = {"n_estimators": n, "max_depth": depth, **merging}
+                label = "-".join([f"pruned-{n}", f"d{depth or 'full'}"] + [f"{k}{v}" for k, v in merging.items()])
+                yield label, settings, RandomForestClassifier(**base, **settings, n_jobs=n_jobs).fit(X_train, y_train)
+
+    # Distillation: the teacher labels the training rows and jittered copies of them
+    rng = np.random.default_rng(seed)
+    X_train = np.asarray(X_train, dtype=np.float64)
+    scale = DISTILL_NOISE * np.nanstd(X_train, axis=0)
+    X_aug = np.vstack([X_train] + [X_train + rng.normal(0.0, 1.0, X_train.shape) * scale for _ in range(DISTILL_COPIES)])
+    y_aug = forest.predict(X_aug)
+    for n, depth in DISTILL_GRID:
+        settings = {"n_estimators": n, "max_depth": depth}
+        student = RandomForestClassifier(**base, **settings, n_jobs=n_jobs).fit(X_aug, y_aug)
+        yield f"distilled-{n}-d{depth or 'full'}", settings, student
+
+
+# ==========================================
+# 2. SCORING
+# ==========================================
+def auc_score(y, probs, classes):
+    if len(classes) == 2:
+        return float(roc_auc_score(y, probs[:, 1]))
+    return float(roc_auc_score(y, probs, multi_class="ovr", labels=classes))
+
+
+def single_row_ms(predict_proba, rows):
+    """
+    Median milliseconds of predict_proba on one row.
+    """
+    predict_proba(rows[0])
+    times = []
+    for row in rows:
+        start = time.perf_counter()
+        predict_proba(row)
+        times.append(time.perf_counter() - start)
+    return float(np.median(times)) * 1000
+
+
+def score_candidate(name, settings, model, X_test, y_test):
+    _, forest = split_pipeline(model)
+    probs = model.predict_proba(X_test)
+    buffer = io.BytesIO()
+    joblib.dump(model, buffer)
+    arrays, max_depth = flatten_forest(forest)
+    rows = [X_test.iloc[[i]] for i in range(min(LATENCY_ROWS, len(X_test)))]
+    flat = compile_forest(model)
+    return {
+        "name": name,
+        "settings": settings,
+        "n_trees": len(forest.estimators_),
+        "n_nodes": int(sum(est.tree_.node_count for est in forest.estimators_)),
+        "max_depth": int(max_depth),
+        "accuracy": float(accuracy_score(y_test, forest.classes_[probs.argmax(axis=1)])),
+        "auc": auc_score(y_test, probs, forest.classes_),
+        "sav_bytes": buffer.getbuffer().nbytes,
+        "flat_bytes": int(sum(a.nbytes for a in arrays.values())),
+        "row_ms": single_row_ms(model.predict_proba, rows),
+        "flat_row_ms": single_row_ms(flat.predict_proba, rows)
+    }
+
+
+def pareto_front(results):
+    """
+    Names of the candidates that no other candidate beats on both size and accuracy.
+    """
+    front, best = set(), -1.0
+    for r in sorted(results, key=lambda r: (r["sav_bytes"], -r["accuracy"])):
+        if r["accuracy"] > best:
+            front.add(r["name"])
+            best = r["accuracy"]
+    return front
+
+
+def choose(results, tolerance, auc_tolerance=None):
+    """
+    The smallest (then fastest) candidate within tolerance of the original's accuracy
+    and auc_tolerance (default: tolerance) of its AUC.
+    """
+    auc_tolerance = tolerance if auc_tolerance is None else auc_tolerance
+    original = next(r for r in results if r["name"] == "original")
+    eligible = [
+        r for r in results
+        if r["accuracy"] >= original["accuracy"] - tolerance and r["auc"] >= original["auc"] - auc_tolerance
+    ]
+    return min(eligible, key=lambda r: (r["sav_bytes"], r["row_ms"]))
+
+
+# ==========================================
+# 3. ONE DISEASE
+# ==========================================
+def compress_disease(disease, config, model, tolerance=DEFAULT_TOLERANCE, auc_tolerance=None, n_jobs=1):
+    """
+    Search the candidates for one trained Pipeline model.
+    Returns (chosen model, report dict).
+    """
+    from trainmodels import load_dataset, prepare_dataset, split_dataset
+
+    preprocess, forest = split_pipeline(model)
+    if preprocess is None:
+        raise ValueError(f"{disease} is a bare forest without its preprocessing; retrain it with trainmodels.py first")
+
+    X, y = prepare_dataset(load_dataset(config), config)
+    X_train, X_test, y_train, y_test = split_dataset(X, y, config)
+    X_train_encoded = preprocess.transform(X_train)
+
+    models = {"original": model}
+    results = [score_candidate("original", {"n_estimators": len(forest.estimators_)}, model, X_test, y_test)]
+    for name, settings, candidate in candidate_forests(forest, X_train_encoded, y_train, config.get("estimator", {}), n_jobs):
+        candidate.set_params(n_jobs=None)
+        models[name] = Pipeline(model.steps[:-1] + [("forest", candidate)])
+        results.append(score_candidate(name, settings, models[name], X_test, y_test))
+
+    front = pareto_front(results)
+    for r in results:
+        r["pareto"] = r["name"] in front
+    chosen = choose(results, tolerance, auc_tolerance)
+    results.sort(key=lambda r: r["sav_bytes"])
+    report = {
+        "disease": disease,
+        "tolerance": tolerance,
+        "auc_tolerance": tolerance if auc_tolerance is None else auc_tolerance,
+        "n_test": len(X_test),
+        "original": next(r for r in results if r["name"] == "original"),
+        "chosen": chosen,
+        "candidates": results
+    }
+    return models[chosen["name"]], report
+
+
+def print_report(report, show_all=False):
+    original, chosen = report["original"], report["chosen"]
+    print(f"\n📉 {report['disease']} ({report['n_test']} held-out rows)")
+    print(f"  {'candidate':<34}{'trees':>6}{'nodes':>9}{'.sav KB':>9}{'flat KB':>9}{'row ms':>8}{'flat ms':>9}{'accuracy':>10}{'AUC':>8}")
+    for r in report["candidates"]:
+        if not (show_all or r["pareto"] or r["name"] in ("original", chosen["name"])):
+            continue
+        mark = "✅" if r["name"] == chosen["name"] else ("⭐" if r["pareto"] else "  ")
+        print(f"{mark}{r['name']:<34}{r['n_trees']:>6}{r['n_nodes']:>9}{r['sav_bytes'] / 1024:>9.0f}{r['flat_bytes'] / 1024:>9.0f}"
+              f"{r['row_ms']:>8.2f}{r['flat_row_ms']:>9.3f}{r['accuracy']:>10.2%}{r['auc']:>8.3f}")
+    print(f"  -> {chosen['name']}: {original['sav_bytes'] / max(chosen['sav_bytes'], 1):.1f}x smaller, "
+          f"{original['row_ms'] / max(chosen['row_ms'], 1e-9):.1f}x faster per row, "
+          f"accuracy {chosen['accuracy'] - original['accuracy']:+.2%}, AUC {chosen['auc'] - original['auc']:+.3f}")
+
+
+def main(argv=None):
+    from trainmodels import SPEC_PATH, file_hash, load_spec
+
+    parser = argparse.ArgumentParser(description="Compress the trained forests within an accuracy/AUC tolerance.")
+    parser.add_argument("--model-dir", default=".", help="Folder containing the model_<Disease>.sav files")
+    parser.add_argument("--spec", default=SPEC_PATH, help="Training spec JSON (default: training_spec.json)")
+    parser.add_argument("--diseases", nargs="+", help="Diseases to compress (default: every trained model in the spec)")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Largest accepted drop in held-out accuracy")
+    parser.add_argument("--auc-tolerance", type=float, help="Largest accepted drop in held-out AUC (default: --tolerance)")
+    parser.add_argument("--out-dir", default="compressed", help="Where the chosen models and the report are written")
+    parser.add_argument("--registry", help="Also register every chosen model as a new version in this registry folder")
+    parser.add_argument("--n-jobs", type=int, default=1, help="Threads per refitted forest")
+    parser.add_argument("--all", action="store_true", help="Print every candidate, not only the Pareto front")
+    args = parser.parse_args(argv)
+
+    spec = load_spec(args.spec)
+    os.makedirs(args.out_dir, exist_ok=True)
+    reports = {}
+    for disease in args.diseases or list(spec):
+        path = os.path.join(args.model_dir, f"model_{disease}.sav")
+        if not os.path.exists(path):
+            print(f"⏭️ {disease}: {path} not found")
+            continue
+        try:
+            chosen, report = compress_disease(disease, spec[disease], joblib.load(path), args.tolerance, args.auc_tolerance, args.n_jobs)
+        except (FileNotFoundError, ValueError) as e:
+            print(f"❌ {disease}: {e}")
+            continue
+        print_report(report, args.all)
+
+        target = os.path.join(args.out_dir, f"model_{disease}.sav")
+        joblib.dump(chosen, target)
+        save_forest(chosen, os.path.splitext(target)[0])
+        save_compact(chosen, compact_path(target))
+        if args.registry:
+            from model_registry import ModelRegistry
+            metrics = {k: report["chosen"][k] for k in ("accuracy", "auc", "n_trees", "n_nodes")}
+            report["version"] = ModelRegistry(args.registry).register(
+                disease, chosen,
+                data_hash=file_hash(spec[disease]["path"]),
+                metrics={**metrics, "compressed_from": os.path.basename(path), "candidate": report["chosen"]["name"]}
+            )
+            print(f"📦 Registered {disease} {report['version']} in {args.registry}/")
+        reports[disease] = report
+
+    with open(os.path.join(args.out_dir, "compression_report.json"), "w", encoding="utf-8") as fh:
+        json.dump(reports, fh, indent=2)
+    print(f"\n✅ Compressed models and compression_report.json written to {args.out_dir}/")
+    return reports
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+Anytime (early-exit) forest evaluation.
+Usage: python early_exit.py [--model-dir .] [--diseases Heart Liver] [--delta 0.001] [--rows 5000]
+
+A prediction only needs the risk band of the probability of disease (< 0.4, 0.4-0.7,
+> 0.7) and the winning class, yet predict_proba always averages every tree. Here the
+trees are evaluated in chunks of 8 (8, 16, 24, ... all) and a row stops as soon as the
+average of the whole forest can no longer cross a band edge:
+
+- for certain, when the remaining N - k trees cannot move the mean across an edge
+  even if they all voted 0 or all voted 1, or
+- with probability 1 - delta, when the Chernoff (KL) interval around the running
+  mean m of the k trees used so far excludes every edge e, i.e. for every edge
+      k * KL(m || e) > ln(2 / d)
+  with d = delta / number of checks, since every check is another chance to stop
+  wrongly. It is never wider than Hoeffding's sqrt(ln(2 / d) / (2k)) and much
+  narrower when m is near 0 or 1, where most patients are.
+
+Tree outputs are leaf class frequencies in [0, 1] and the trees of a random forest are
+grown independently, which is what the bound assumes (Hoeffding 1963 shows it also
+holds for the first k of N trees, i.e. sampling without replacement). The probability
+returned is the average of the trees used, close to but not always equal to the full
+forest's.
+
+Single rows gain little on FlatForest exports, whose walk costs about the same for 8
+trees as for 100 and is small next to the preprocessing; with the per-chunk overhead
+they are usually slower than the full forest. The savings are in batches, where
+decided rows drop out of the later chunks, and in plain sklearn forests, which pay a
+fixed overhead per tree. The CLI reports both, plus how often the risk band and
+class match the full forest.
+"""
+import argparse
+import math
+import os
+import time
+
+import numpy as np
+
+import inference
+from forest_arrays import FlatForest, split_pipeline
+from instrumentation import METRICS, PROFILER
+
+DEFAULT_DELTA = 0.001
+CHUNK_SIZE = 8
+
+
+# ==========================================
+# 1. BAND EDGES
+# ==========================================
+def band_edges(model_name, classes):
+    """
+    (column, edges): the predict_proba column that decides the result and the values
+    of it at which the risk band or the predicted class changes.
+    None for models with more than two classes, which are always evaluated in full.
+    """
+    classes = np.asarray(classes)
+    if len(classes) != 2:
+        return None
+    if model_name == "Heart":
+        # Class 0 is the disease; the label flips at 0.5
+        return 0, (0.4, 0.5, 0.7)
+    if model_name == "Malaria_Pneumonia":
+        if classes.dtype.kind not in "OUS":
+            return None
+        # Probability of disease is max(p, 1 - p): Moderate while p is in [0.3, 0.7]
+        return 0, (0.3, 0.5, 0.7)
+    return 1, (0.4, 0.5, 0.7)
+
+
+def chunk_bounds(n_trees, step=CHUNK_SIZE):
+    """
+    Number of trees evaluated after each chunk: step, 2 * step, 3 * step, ..., n_trees.
+    """
+    return list(range(step, n_trees, step)) + [n_trees]
+
+
+def kl_divergence(p, q):
+    """
+    KL(p || q) between Bernoulli distributions, elementwise; q must be in (0, 1).
+    """
+    p = np.clip(p, 0.0, 1.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (np.where(p > 0, p * np.log(p / q), 0.0)
+                + np.where(p < 1, (1 - p) * np.log((1 - p) / (1 - q)), 0.0))
+
+
+# ==========================================
+# 2. PER-TREE EVALUATION
+# ==========================================
+def _tree_values(model, X):
+    """
+    (values, n_trees): values(rows, start, stop) gives the class probabilities of trees
+    start..stop for the given rows of X, shape (rows, trees, classes).
+    """
+    if isinstance(model, FlatForest):
+        X = model._validate(X)
+        return (lambda rows, start, stop: model.value[model.apply_trees(X[rows], start, stop)]), model.n_estimators
+
+    preprocess, forest = split_pipeline(model)
+    if preprocess is not None:
+        X = preprocess.transform(X)
+    X = forest._validate_X_predict(X)
+    estimators = forest.estimators_
+
+    def values(rows, start, stop):
+        return np.stack([est.predict_proba(X[rows], check_input=False) for est in estimators[start:stop]], axis=1)
+
+    return values, len(estimators)
+
+
+def anytime_proba(model_name, model, X, delta=DEFAULT_DELTA, chunk_size=CHUNK_SIZE):
+    """
+    predict_proba with early exit. Returns (probs, trees_used): the average class
+    probabilities over the trees each row used, and how many trees that was.
+    """
+    values, n_trees = _tree_values(model, X)
+    n_rows = len(X)
+    spec = band_edges(model_name, model.classes_)
+    if spec is None:
+        return values(np.arange(n_rows), 0, n_trees).mean(axis=1), np.full(n_rows, n_trees)
+
+    column, edges = spec
+    edges = np.asarray(edges)
+    bounds = chunk_bounds(n_trees, chunk_size)
+    log_term = math.log(2 / (delta / len(bounds)))
+
+    sums = np.zeros((n_rows, len(model.classes_)))
+    used = np.zeros(n_rows, dtype=np.int64)
+    active = np.arange(n_rows)
+    start = 0
+    for k in bounds:
+        sums[active] += values(active, start, k).sum(axis=1)
+        used[active] = k
+        if k == n_trees:
+            break
+
+        total = sums[active, column]
+        mean = total / k
+        # An edge is still reachable if it lies in the KL interval and in the exact
+        # range of the full average given the k votes seen so far
+        in_interval = k * kl_divergence(mean[:, None], edges) <= log_term
+        in_range = (total[:, None] / n_trees <= edges) & (edges <= (total[:, None] + n_trees - k) / n_trees)
+        undecided = (in_interval & in_range).any(axis=1)
+        active = active[undecided]
+        if not len(active):
+            break
+        start = k
+
+    return sums / used[:, None], used
+
+
+def predict_rows_anytime(model_name, model, features, delta=DEFAULT_DELTA):
+    """
+    inference.predict_rows with early exit; every result also carries trees_used and n_estimators.
+    """
+    with PROFILER.profile():
+        with METRICS.timer("anytime_proba", disease=model_name):
+            probs, used = anytime_proba(model_name, model, features, delta)
+        with METRICS.timer("batch_risk", disease=model_name):
+            labels = model.classes_[np.argmax(probs, axis=1)]
+            results = [inference.describe_prediction(model_name, model, labels[i], probs[i]) for i in range(len(probs))]
+    n_trees = model.n_estimators if isinstance(model, FlatForest) else len(split_pipeline(model)[1].estimators_)
+    for result, trees in zip(results, used):
+        METRICS.observe("sher_trees_used", int(trees), disease=model_name)
+        METRICS.inc("sher_predictions_total", disease=model_name, risk_level=result["risk_level"], status=result["status"])
+        result.update(trees_used=int(trees), n_estimators=n_trees)
+    return results
+
+
+def predict_anytime(model_name, model, input_data, delta=DEFAULT_DELTA):
+    """
+    inference.predict with early exit; the result also carries trees_used and n_estimators.
+    """
+    return predict_rows_anytime(model_name, model, input_data, delta)[0]
+
+
+def cache_mode(delta):
+    """
+    PredictionCache mode of results computed with early exit at delta (None for the
+    full forest), so that neither kind of result is ever served for the other.
+    """
+    return f"anytime-{delta:g}" if delta else None
+
+
+# ==========================================
+# 3. EVALUATION
+# ==========================================
+def _evaluation_rows(disease, model, n_rows, seed=0):
+    """
+    Patients to evaluate on: the training dataset when it is available, random form values otherwise.
+    """
+    try:
+        from trainmodels import load_dataset, load_spec, prepare_dataset
+        config = load_spec()[disease]
+        X, _ = prepare_dataset(load_dataset(config), config)
+        X = X[list(model.feature_names_in_)]
+        return X.sample(min(n_rows, len(X)), random_state=seed).reset_index(drop=True), "dataset"
+    except (FileNotFoundError, KeyError, AttributeError, ValueError):
+        records = inference.sample_inputs(disease, model, n_rows, seed).to_dict("records")
+        return inference.build_feature_rows(disease, model, records), "random"
+
+
+def evaluate(disease, model, n_rows=5000, delta=DEFAULT_DELTA, single_rows=200, seed=0):
+    X, source = _evaluation_rows(disease, model, n_rows, seed)
+    model.predict_proba(X[:1] if not hasattr(X, "iloc") else X.iloc[:1])  # warm up
+    start = time.perf_counter()
+    full = model.predict_proba(X)
+    full_s = time.perf_counter() - start
+    start = time.perf_counter()
+    probs, used = anytime_proba(disease, model, X, delta)
+    anytime_s = time.perf_counter() - start
+
+    labels_full, prob_full = inference.disease_probabilities(disease, model.classes_, full)
+    labels_any, prob_any = inference.disease_probabilities(disease, model.classes_, probs)
+    same_band = inference.get_risk_levels(prob_full) == inference.get_risk_levels(prob_any)
+
+    rows = [X.iloc[[i]] if hasattr(X, "iloc") else X[i:i + 1] for i in range(min(single_rows, len(X)))]
+    start = time.perf_counter()
+    for row in rows:
+        model.predict_proba(row)
+    single_full = (time.perf_counter() - start) / len(rows)
+    start = time.perf_counter()
+    for row in rows:
+        anytime_proba(disease, model, row, delta)
+    single_any = (time.perf_counter() - start) / len(rows)
+
+    return {
+        "rows": len(X), "source": source, "n_estimators": int(used.max()),
+        "mean_trees": float(used.mean()), "stopped_first_chunk": float(np.mean(used == used.min())),
+        "same_band": float(same_band.mean()), "same_label": float(np.mean(labels_full == labels_any)),
+        "max_abs_diff": float(np.abs(prob_full - prob_any).max()),
+        "batch_full_ms": full_s * 1000, "batch_anytime_ms": anytime_s * 1000,
+        "single_full_ms": single_full * 1000, "single_anytime_ms": single_any * 1000
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure early-exit forest evaluation against the full forest.")
+    parser.add_argument("--model-dir", default=".", help="Folder containing the model_<Disease>.sav files")
+    parser.add_argument("--diseases", nargs="+", help="Models to evaluate (default: every model found)")
+    parser.add_argument("--delta", type=float, default=DEFAULT_DELTA, help="Allowed probability of a wrong early stop per row")
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--sklearn", action="store_true", help="Evaluate the pickled sklearn forests, not the array exports")
+    args = parser.parse_args()
+
+    print(f"{'Disease':<20}{'rows':>7}{'trees':>8}{'same band':>11}{'same label':>12}{'max |dp|':>10}"
+          f"{'batch ms':>18}{'row ms':>16}")
+    for disease in args.diseases or list(inference.MODEL_FILES):
+        path = os.path.join(args.model_dir, inference.MODEL_FILES.get(disease, f"model_{disease}.sav"))
+        if not (os.path.exists(path) or os.path.isdir(os.path.splitext(path)[0])):
+            print(f"⏭️ {disease}: {path} not found")
+            continue
+        if args.sklearn:
+            import joblib
+            model = joblib.load(path)
+        else:
+            model = inference.load_model_file(path)
+        r = evaluate(disease, model, args.rows, args.delta)
+        print(f"{disease:<20}{r['rows']:>7}{r['mean_trees']:>5.1f}/{r['n_estimators']:<3}{r['same_band']:>10.2%}"
+              f"{r['same_label']:>12.2%}{r['max_abs_diff']:>10.3f}"
+              f"{r['batch_full_ms']:>9.1f}->{r['batch_anytime_ms']:<7.1f}{r['single_full_ms']:>7.2f}->{r['single_anytime_ms']:<7.2f}")
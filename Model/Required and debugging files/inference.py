@@ -0,0 +1,693 @@
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.pipeline import Pipeline
+
+from compact_forest import compact_path, load_compact
+from forest_arrays import load_forest, split_pipeline
+from instrumentation import METRICS, PROFILER
+
+# ==========================================
+# 1. MODEL FILES & FEATURE LAYOUTS
+# ==========================================
+MODEL_FILES = {
+    "Diabetes": "model_Diabetes.sav",
+    "Heart": "model_Heart.sav",
+    "Kidney": "model_Kidney.sav",
+    "Liver": "model_Liver.sav",
+    "Hypertension": "model_Hypertension.sav",
+    "Malaria_Pneumonia": "model_Malaria_Pneumonia.sav"
+}
+
+# Exports read instead of the .sav, in order of preference (see model_artifact).
+# "arrays" (model_<Disease>/, forest_arrays.py) is memory-mapped, so every worker
+# process shares one copy in the page cache; "compact" (model_<Disease>.sherbin,
+# compact_forest.py) is the smallest file and the fastest to load, but is expanded
+# into private arrays in every process.
+MODEL_FORMATS = ("arrays", "compact")
+
+# Models saved by trainmodels.py are Pipelines that take named columns and impute
+# whatever is missing with the training means. These are the training column(s)
+# each input of the app.py forms feeds; the field name itself is always tried too.
+# Form inputs the dataset has no column for (e.g. bilirubin for Liver) are not used.
+FEATURE_NAMES = {
+    "Diabetes": {
+        "pregnancies": ["Pregnancies"], "glucose": ["Glucose"], "bp": ["BloodPressure"],
+        "skin": ["SkinThickness"], "insulin": ["Insulin"], "bmi": ["BMI"],
+        "dpf": ["DiabetesPedigreeFunction"], "age": ["Age"]
+    },
+    "Heart": {
+        "age": ["age"], "sex": ["gender"], "cp": ["chestpain"], "trestbps": ["restingBP"],
+        "chol": ["serumcholestrol"], "fbs": ["fastingbloodsugar"], "restecg": ["restingrelectro"],
+        "thalach": ["maxheartrate"], "exang": ["exerciseangia"], "oldpeak": ["oldpeak"],
+        "slope": ["slope"], "ca": ["noofmajorvessels"]
+    },
+    "Liver": {
+        "age": ["Age"], "gender": ["Gender"]
+    },
+    "Kidney": {
+        "age": ["Age"], "bp": ["SystolicBP"], "sc": ["SerumCreatinine"], "hemo": ["HemoglobinLevels"]
+    },
+    "Hypertension": {
+        "age": ["Age"], "sex": ["Sex", "Gender"], "bmi": ["BMI"], "chol": ["Cholesterol"],
+        "sys_bp": ["Systolic_BP", "SystolicBP"], "dia_bp": ["Diastolic_BP", "DiastolicBP"],
+        "smoke": ["Smoking", "Smoker"], "glucose": ["Glucose"]
+    },
+    "Malaria_Pneumonia": {}
+}
+
+# Legacy models (bare forests saved before the Pipeline change) take a plain array.
+# This is where each form input lands in their feature vector; positions not listed
+# are zero-filled, as the single-patient pages used to do.
+FEATURE_LAYOUTS = {
+    "Diabetes": [
+        ("pregnancies", 1), ("glucose", 2), ("bp", 3), ("skin", 4),
+        ("insulin", 5), ("bmi", 6), ("dpf", 7), ("age", 8)
+    ],
+    "Heart": [
+        ("age", 0), ("sex", 1), ("cp", 2), ("trestbps", 3), ("chol", 4), ("fbs", 5),
+        ("restecg", 6), ("thalach", 7), ("exang", 8), ("oldpeak", 9), ("slope", 10), ("ca", 11)
+    ],
+    "Liver": [
+        ("age", 0), ("gender", 1), ("total_bil", 2), ("direct_bil", 3), ("alkphos", 4),
+        ("sgpt", 5), ("sgot", 6), ("proteins", 7), ("albumin", 8), ("ag_ratio", 9)
+    ],
+    "Kidney": [
+        ("age", 0), ("bp", 1), ("sg", 2), ("al", 3), ("su", 4), ("rbc", 5),
+        ("sc", 9), ("hemo", 10)
+    ],
+    "Hypertension": [
+        ("age", 0), ("sex", 1), ("bmi", 2), ("chol", 3), ("sys_bp", 4),
+        ("dia_bp", 5), ("smoke", 6), ("glucose", 12)
+    ],
+    "Malaria_Pneumonia": [
+        ("high_fever", 0), ("chills", 1), ("vomiting", 2), ("headache", 3),
+        ("sweating", 4), ("muscle_pain", 5), ("cough", 6), ("phlegm", 7),
+        ("breathlessness", 8), ("chest_pain", 9), ("fast_heart_rate", 10), ("fatigue", 11)
+    ]
+}
+
+RISK_LEVELS = ["Low", "Moderate", "High"]
+
+# ==========================================
+# 2. LOADING
+# ==========================================
+
+def estimate_model_bytes(model, filename=None):
+    """
+    Approximate resident size of a fitted model: the node and value arrays of
+    every tree for forests, otherwise the size of the file it was loaded from.
+    Memory-mapped forests only count their private (non-shared) memory.
+    """
+    if hasattr(model, "resident_bytes"):
+        return model.resident_bytes()
+    _, forest = split_pipeline(model)
+    estimators = getattr(forest, "estimators_", None)
+    if estimators is not None:
+        total = 0
+        for est in estimators:
+            tree = getattr(est, "tree_", None)
+            if tree is not None:
+                state = tree.__getstate__()
+                total += state["nodes"].nbytes + state["values"].nbytes
+        return total
+    if filename is not None and os.path.exists(filename):
+        return os.path.getsize(filename)
+    return 0
+
+class ModelCache(Mapping):
+    """
+    Lazily loaded disease models.
+
+    A model is loaded the first time it is looked up and kept in LRU order. By
+    default a memory-mappable export (model_<Disease>/, see forest_arrays.py) next to
+    the .sav is mapped read-only instead of unpickling the forest, so all processes
+    on the machine share one copy of the arrays; otherwise a compact export
+    (model_<Disease>.sherbin, see compact_forest.py) is read, which takes well under
+    a millisecond. formats changes that order (see MODEL_FORMATS), and exports older
+    than the .sav are ignored (see model_artifact); on_load(name, artifact) is told
+    which file was read.
+    When max_bytes is set, the least recently used models are evicted until the
+    loaded models fit the budget again (the model just requested always stays).
+    keys() and `in` only check which files exist, so they never trigger a load.
+    """
+
+    def __init__(self, model_dir=".", model_files=None, max_bytes=None, on_error=None, on_load=None, formats=MODEL_FORMATS):
+        self.model_dir = model_dir
+        self.max_bytes = max_bytes
+        self.on_error = on_error
+        self.on_load = on_load
+        self.formats = formats
+        self._files = {}
+        for name, filename in (model_files or MODEL_FILES).items():
+            path = os.path.join(model_dir, filename)
+            if os.path.exists(model_artifact(path, formats)):
+                self._files[name] = path
+            elif on_error is not None:
+                on_error(name, filename, FileNotFoundError(path))
+        self._loaded = OrderedDict()
+        self._sizes = {}
+        self._versions = {}
+        self._lock = threading.Lock()
+        self._load_locks = {name: threading.Lock() for name in self._files}
+
+    def __getitem__(self, name):
+        if name not in self._files:
+            raise KeyError(name)
+        with self._lock:
+            if name in self._loaded:
+                self._loaded.move_to_end(name)
+                return self._loaded[name]
+
+        # Load outside the global lock so other models stay available meanwhile
+        with self._load_locks[name]:
+            with self._lock:
+                if name in self._loaded:
+                    self._loaded.move_to_end(name)
+                    return self._loaded[name]
+            path = self._files[name]
+            artifact = model_artifact(path, self.formats)
+            try:
+                model = load_model_file(path, self.formats)
+            except Exception as e:
+                if self.on_error is not None:
+                    self.on_error(name, os.path.basename(artifact), e)
+                raise KeyError(name) from e
+            if self.on_load is not None:
+                self.on_load(name, artifact)
+
+            with self._lock:
+                self._loaded[name] = model
+                self._sizes[name] = estimate_model_bytes(model, path)
+                self._versions[name] = file_version(path, self.formats)
+                self._evict(keep=name)
+            return model
+
+    def __contains__(self, name):
+        return name in self._files
+
+    def __iter__(self):
+        return iter(self._files)
+
+    def __len__(self):
+        return len(self._files)
+
+    def _evict(self, keep):
+        if self.max_bytes is None:
+            return
+        while self.memory_usage() > self.max_bytes and len(self._loaded) > 1:
+            oldest = next(iter(self._loaded))
+            if oldest == keep:
+                self._loaded.move_to_end(oldest)
+                continue
+            del self._loaded[oldest]
+            del self._sizes[oldest]
+
+    def loaded(self):
+        """
+        Names of the models currently held in memory, least recently used first.
+        """
+        with self._lock:
+            return list(self._loaded)
+
+    def memory_usage(self):
+        return sum(self._sizes.values())
+
+    def version(self, name):
+        """
+        Identifies the file the loaded model came from (name, mtime and size), so results
+        cached for it are not reused once a retrained model is loaded. None if not loaded.
+        """
+        with self._lock:
+            return self._versions.get(name) if name in self._loaded else None
+
+    def preload(self, names=None, background=True):
+        """
+        Load models ahead of their first use, by default in a daemon thread.
+        """
+        names = [n for n in (names or list(self._files)) if n in self._files]
+
+        def _load_all():
+            for name in names:
+                try:
+                    self[name]
+                except KeyError:
+                    pass
+
+        if not background:
+            _load_all()
+            return None
+        thread = threading.Thread(target=_load_all, name="model-preload", daemon=True)
+        thread.start()
+        return thread
+
+def parse_formats(text):
+    """
+    MODEL_FORMATS from a comma-separated string such as "compact,arrays" ("" or
+    "pickle": always the .sav).
+    """
+    formats = tuple(f.strip() for f in (text or "").split(",") if f.strip() and f.strip() != "pickle")
+    unknown = [f for f in formats if f not in ("arrays", "compact")]
+    if unknown:
+        raise ValueError(f"Unknown model format(s): {', '.join(unknown)} (use arrays, compact or pickle)")
+    return formats
+
+def model_artifact(path, formats=MODEL_FORMATS):
+    """
+    The file load_model_file(path) reads for a model_<Disease>.sav path: the first
+    export of formats that exists, else the .sav itself. An export is only used when
+    it is at least as new as the .sav, so a retrained or copied .sav is never
+    shadowed by a stale export.
+    """
+    sav_mtime = os.stat(path).st_mtime_ns if os.path.exists(path) else None
+    mapped_dir = os.path.splitext(path)[0]
+    # save_forest writes meta.json last, so it dates the whole folder
+    candidates = {"arrays": (mapped_dir, os.path.join(mapped_dir, "meta.json")),
+                  "compact": (compact_path(path), compact_path(path))}
+    for fmt in formats:
+        artifact, stamp = candidates[fmt]
+        if os.path.isfile(stamp) and (sav_mtime is None or os.stat(stamp).st_mtime_ns >= sav_mtime):
+            return artifact
+    return path
+
+def file_version(path, formats=MODEL_FORMATS):
+    path = model_artifact(path, formats)
+    st = os.stat(path)
+    return f"{os.path.basename(path)}@{st.st_mtime_ns:x}-{st.st_size:x}"
+
+def load_model_file(path, formats=MODEL_FORMATS):
+    artifact = model_artifact(path, formats)
+    if artifact == compact_path(path):
+        return load_compact(artifact)
+    if artifact != path:
+        return load_forest(artifact, mmap_mode="r")
+    return joblib.load(path)
+
+def load_models(model_dir=".", on_error=None, max_bytes=None, preload=False, registry=None, on_load=None,
+                formats=MODEL_FORMATS):
+    """
+    Open the disease models in model_dir as a lazily loaded ModelCache.
+
+    on_error(name, filename, exc) is called for models that are missing or cannot
+    be loaded, so callers (Streamlit, the HTTP server) can report it their own way;
+    on_load(name, path) is called with the file each model was actually read from,
+    chosen by formats (see MODEL_FORMATS).
+    max_bytes caps the memory held by loaded models; preload=True warms the cache
+    in a background thread. With registry (a model_registry.py root folder) the
+    CURRENT version of each disease is served instead and hot-swapped on change.
+    """
+    if registry:
+        from model_registry import RegistryModels
+        return RegistryModels(registry, on_error=on_error, on_load=on_load, formats=formats)
+    models = ModelCache(model_dir, max_bytes=max_bytes, on_error=on_error, on_load=on_load, formats=formats)
+    if preload:
+        models.preload()
+    return models
+
+# ==========================================
+# 3. RISK HELPERS
+# ==========================================
+
+def get_risk_level(probability):
+    """
+    Determine risk level based on probability of the disease.
+    """
+    if probability < 0.4:
+        return "Low"
+    elif 0.4 <= probability <= 0.7:
+        return "Moderate"
+    else:
+        return "High"
+
+def get_risk_levels(probabilities):
+    """
+    Vectorized get_risk_level for a whole column of probabilities.
+    """
+    p = np.asarray(probabilities, dtype=float)
+    return np.select([p < 0.4, p <= 0.7], RISK_LEVELS[:2], default="High")
+
+def disease_probabilities(model_name, classes, probs):
+    """
+    Turn a predict_proba matrix into (label, probability of disease) columns,
+    following the per-model class conventions used by the app.
+    """
+    classes = np.asarray(classes)
+    probs = np.asarray(probs, dtype=float)
+    labels = classes[probs.argmax(axis=1)]
+
+    if model_name == "Heart":
+        # Heart: 0 = High Risk, 1 = Low Risk
+        prob_disease = probs[:, 0]
+
+    elif model_name == "Malaria_Pneumonia":
+        if classes.dtype.kind in "OUS":
+            # classes_ = ['Malaria', 'Pneumonia']: confidence of the detected condition
+            prob_disease = probs.max(axis=1)
+        else:
+            # Legacy integer handling: 0 = Healthy, so the disease is everything else
+            prob_disease = np.where(labels == 0, 1 - probs[:, 0], probs.max(axis=1))
+
+    else:
+        # Standard Binary: 1 = Disease, 0 = Healthy
+        if len(classes) > 1:
+            prob_disease = probs[:, 1]
+        elif classes[0] == 1:
+            prob_disease = probs[:, 0]
+        else:
+            prob_disease = np.zeros(len(probs))
+
+    return labels, prob_disease
+
+# ==========================================
+# 4. SINGLE PATIENT PREDICTION
+# ==========================================
+
+def _key(name):
+    return str(name).strip().lower().replace("_", "").replace(" ", "")
+
+def uses_named_inputs(model):
+    """
+    Pipelines (and compiled forests carrying their preprocessing) take named columns.
+    """
+    return isinstance(model, Pipeline) or getattr(model, "preprocess", None) is not None
+
+def named_inputs(model_name, model):
+    """
+    {training column: form field} for the columns of a named-input model that
+    one of the app's form fields feeds.
+    """
+    trained = {_key(c): c for c in model.feature_names_in_}
+    mapping = {}
+    for field, candidates in FEATURE_NAMES.get(model_name, {}).items():
+        for candidate in candidates + [field]:
+            column = trained.get(_key(candidate))
+            if column is not None:
+                mapping[column] = field
+                break
+    for field, _ in FEATURE_LAYOUTS.get(model_name, []):
+        column = trained.get(_key(field))
+        if column is not None and column not in mapping:
+            mapping[column] = field
+    return mapping
+
+def build_features(model_name, model, record):
+    """
+    Build the model input for one patient from a dict of form fields.
+
+    Named-input models get a one-row DataFrame in training column order; keys may be
+    form fields or training column names, and anything not given is left missing
+    for the pipeline's imputer. Legacy models get a zero-filled (1, n_features) array.
+    """
+    with METRICS.timer("features", disease=model_name), PROFILER.profile():
+        return build_feature_rows(model_name, model, [record])
+
+def build_feature_rows(model_name, model, records):
+    """
+    build_features for several patients at once: one row per record, in order.
+    """
+    if uses_named_inputs(model):
+        fields = named_inputs(model_name, model)
+        rows = []
+        for record in records:
+            row = {}
+            for column in model.feature_names_in_:
+                if column in record:
+                    row[column] = record[column]
+                elif fields.get(column) in record:
+                    row[column] = record[fields[column]]
+                else:
+                    row[column] = np.nan
+            rows.append(row)
+        return pd.DataFrame(rows, columns=list(model.feature_names_in_))
+
+    layout = FEATURE_LAYOUTS[model_name]
+    features = np.zeros((len(records), model.n_features_in_))
+    for i, record in enumerate(records):
+        missing = [field for field, _ in layout if field not in record]
+        if missing:
+            raise ValueError(f"Missing inputs for {model_name}: {', '.join(missing)}")
+        for field, idx in layout:
+            features[i, idx] = float(record[field])
+    return features
+
+def input_fields(model_name, model):
+    """
+    The form fields the app sends for this model.
+    """
+    if uses_named_inputs(model):
+        return list(dict.fromkeys(named_inputs(model_name, model).values()))
+    return [field for field, _ in FEATURE_LAYOUTS[model_name]]
+
+def sample_inputs(model_name, model, n, seed=0):
+    """
+    n random patients as a DataFrame of form fields, from a seeded generator: 0/1
+    for symptoms, 0-100 otherwise. Used by the benchmark and the export checks.
+    """
+    rng = np.random.default_rng(seed)
+    binary = {field for field, _ in FEATURE_LAYOUTS["Malaria_Pneumonia"]}
+    return pd.DataFrame({
+        field: rng.integers(0, 2, n) if field in binary else np.round(rng.uniform(0, 100, n), 1)
+        for field in input_fields(model_name, model)
+    })
+
+def predict(model_name, model, input_data):
+    """
+    Run one model on one input row and describe the outcome.
+
+    Returns a dict with the predicted label, the probability of disease, its risk
+    level, a status ('detected', 'elevated' or 'healthy'), a short summary, the
+    confidence shown next to it, and the risk level whose care insights apply.
+    """
+    with PROFILER.profile():
+        # One forest evaluation per request: the label is the argmax of the
+        # probabilities, which is exactly what the classifier's predict() computes.
+        if hasattr(model, "predict_proba"):
+            with METRICS.timer("predict_proba", disease=model_name):
+                probs = model.predict_proba(input_data)[0]
+            prediction = model.classes_[np.argmax(probs)]
+        else:
+            with METRICS.timer("predict", disease=model_name):
+                probs = None
+                prediction = model.predict(input_data)[0]
+
+        with METRICS.timer("risk", disease=model_name):
+            result = describe_prediction(model_name, model, prediction, probs)
+    METRICS.inc("sher_predictions_total", disease=model_name, risk_level=result["risk_level"], status=result["status"])
+    return result
+
+def predict_rows(model_name, model, features):
+    """
+    predict() for every row of a feature matrix with one predict_proba call.
+    """
+    with PROFILER.profile():
+        with METRICS.timer("batch_predict_proba", disease=model_name):
+            probs = model.predict_proba(features)
+        with METRICS.timer("batch_risk", disease=model_name):
+            labels = model.classes_[np.argmax(probs, axis=1)]
+            results = [describe_prediction(model_name, model, labels[i], probs[i]) for i in range(len(probs))]
+    for result in results:
+        METRICS.inc("sher_predictions_total", disease=model_name, risk_level=result["risk_level"], status=result["status"])
+    return results
+
+def describe_prediction(model_name, model, prediction, probs):
+    """
+    Risk level, status and summary of one prediction (see predict).
+    """
+    # --- LOGIC PER MODEL ---
+    if model_name == "Heart":
+        # Heart: 0 = High Risk, 1 = Low Risk
+        # Probability of Disease (class 0) = probs[0]
+        prob_disease = probs[0] if probs is not None else (1.0 if prediction == 0 else 0.0)
+        risk_level = get_risk_level(prob_disease)
+        insights_level = risk_level
+
+        if prediction == 0:
+            status, summary, confidence = "detected", "Heart Disease Detected", prob_disease
+        elif risk_level == "Moderate":
+            status, summary, confidence = "elevated", "Low Risk, but Moderate Probability", prob_disease
+        else:
+            status, summary, confidence = "healthy", "Heart is Healthy", 1 - prob_disease
+
+    elif model_name == "Malaria_Pneumonia":
+        # classes_ = ['Malaria', 'Pneumonia']: the model returns the condition name
+        if isinstance(prediction, str):
+            try:
+                # Get index of the predicted class to find its probability
+                class_idx = list(model.classes_).index(prediction)
+                prob_disease = probs[class_idx] if probs is not None else 1.0
+            except (ValueError, IndexError):
+                prob_disease = 1.0
+
+            risk_level = get_risk_level(prob_disease)
+            insights_level = risk_level
+            status, summary, confidence = "detected", f"{prediction} Detected", prob_disease
+
+        # Legacy integer handling if generic (same probability as disease_probabilities)
+        elif prediction == 0:
+            prob_healthy = probs[0] if probs is not None else 1.0
+            prob_disease = 1 - prob_healthy
+            risk_level = insights_level = get_risk_level(prob_disease)
+            if risk_level == "Low":
+                status, summary, confidence = "healthy", "Healthy", prob_healthy
+            else:
+                status, summary, confidence = "elevated", "Healthy, but Moderate Probability", prob_disease
+        else:
+            condition = "Malaria" if prediction == 1 else "Pneumonia"
+            prob_disease = probs[prediction] if probs is not None else 1.0
+            risk_level = get_risk_level(prob_disease)
+            insights_level = risk_level
+            status, summary, confidence = "detected", f"{condition} Detected", prob_disease
+
+    else:
+        # Standard Binary: 1 = Disease, 0 = Healthy
+        # Diabetes, Liver, Kidney, Hypertension
+        prob_disease = 0.0
+        if probs is not None:
+            if len(probs) > 1:
+                prob_disease = probs[1]
+            elif len(probs) == 1:
+                # Model has only 1 class: it is the disease probability only if
+                # that class is the disease (1).
+                prob_disease = probs[0] if prediction == 1 else 0.0
+        else:
+            prob_disease = 1.0 if prediction == 1 else 0.0
+
+        risk_level = get_risk_level(prob_disease)
+
+        if prediction == 1:
+            insights_level = risk_level
+            status, summary, confidence = "detected", f"High Risk of {model_name}", prob_disease
+        elif risk_level == "Moderate":
+            # Healthy class predicted but probability of disease is in moderate range (e.g. 0.45)
+            insights_level = risk_level
+            status, summary, confidence = "elevated", "Low Risk, but elevated probability", prob_disease
+        else:
+            insights_level = "Low"
+            status, summary, confidence = "healthy", "Low Risk (Healthy)", 1 - prob_disease
+
+    return {
+        "disease": model_name,
+        "prediction": _to_builtin(prediction),
+        "probability": float(prob_disease),
+        "risk_level": risk_level,
+        "status": status,
+        "summary": summary,
+        "confidence": float(confidence),
+        "insights_level": insights_level
+    }
+
+def _to_builtin(value):
+    # numpy scalars (np.int64, np.str_) are not JSON serializable
+    return value.item() if isinstance(value, np.generic) else value
+
+# ==========================================
+# 5. BATCH SCORING
+# ==========================================
+
+def _normalize(name):
+    return str(name).strip().lower()
+
+def _coerce_column(values):
+    """
+    An uploaded column as numbers (unparseable entries -> NaN for the imputer),
+    unless none of its values is a number, e.g. the text of a categorical input.
+    """
+    numbers = pd.to_numeric(values, errors="coerce")
+    if numbers.notna().any() or values.isna().all():
+        return numbers.to_numpy(dtype=float)
+    return values.to_numpy()
+
+def build_feature_matrix(model_name, model, df):
+    """
+    Map the columns of an uploaded patient table to the model's feature matrix.
+
+    Columns may be named after the app's form fields (e.g. 'glucose') or after the
+    training columns stored on the model (feature_names_in_). Named-input models are
+    scored as build_features does: at least one of their inputs must be present and
+    the rest is left to the pipeline's imputer. Legacy models need every input.
+    Returns None when the table does not carry enough inputs.
+    """
+    lookup = {_normalize(c): c for c in df.columns}
+    n_features = model.n_features_in_
+    trained_names = list(getattr(model, "feature_names_in_", []))
+
+    if uses_named_inputs(model):
+        # Named columns, missing ones left to the pipeline's imputer
+        fields = named_inputs(model_name, model)
+        sources = {c: lookup.get(_normalize(c)) or lookup.get(fields.get(c, "")) for c in trained_names}
+        if not any(sources.values()):
+            return None
+        return pd.DataFrame(
+            {c: (_coerce_column(df[src]) if src is not None else np.nan) for c, src in sources.items()},
+            columns=trained_names,
+            index=range(len(df))
+        )
+
+    # Full training layout available: use it as-is
+    if trained_names and all(_normalize(n) in lookup for n in trained_names):
+        cols = [lookup[_normalize(n)] for n in trained_names]
+        return df[cols].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+
+    layout = FEATURE_LAYOUTS.get(model_name)
+    if layout is None:
+        return None
+
+    features = np.zeros((len(df), n_features))
+    for field, idx in layout:
+        column = lookup.get(field)
+        if column is None and idx < len(trained_names):
+            column = lookup.get(_normalize(trained_names[idx]))
+        if column is None:
+            return None
+        features[:, idx] = pd.to_numeric(df[column], errors="coerce").to_numpy(dtype=float)
+    return features
+
+def score_frame(models, df):
+    """
+    Score every patient row against every model that gets at least one of its inputs
+    (all of them for legacy models; see build_feature_matrix).
+
+    One predict_proba call per model on the whole matrix. Returns the input table
+    with <Disease>_prediction / _probability / _risk columns appended, plus the
+    list of models that were skipped because their inputs were missing.
+    """
+    results = df.copy()
+    skipped = []
+
+    for model_name, model in models.items():
+        with PROFILER.profile():
+            with METRICS.timer("batch_features", disease=model_name):
+                features = build_feature_matrix(model_name, model, df)
+            if features is None:
+                skipped.append(model_name)
+                continue
+            if not uses_named_inputs(model):
+                # Unparseable cells are treated like the zero-filled defaults of the forms
+                features = np.nan_to_num(features, nan=0.0)
+
+            with METRICS.timer("batch_predict_proba", disease=model_name):
+                probs = model.predict_proba(features)
+            with METRICS.timer("batch_risk", disease=model_name):
+                labels, prob_disease = disease_probabilities(model_name, model.classes_, probs)
+                risk = get_risk_levels(prob_disease)
+
+        results[f"{model_name}_prediction"] = labels
+        results[f"{model_name}_probability"] = prob_disease
+        results[f"{model_name}_risk"] = risk
+        METRICS.inc("sher_rows_scored_total", len(df), disease=model_name)
+
+    return results, skipped
+
+def read_patient_table(file, filename=None):
+    """
+    Read an uploaded CSV or Parquet file into a DataFrame.
+    """
+    name = (filename or getattr(file, "name", "") or "").lower()
+    if name.endswith(".parquet"):
+        return pd.read_parquet(file)
+    return pd.read_csv(file)
@@ -0,0 +1,377 @@
+"""
+Low-overhead metrics and profiling for the prediction path.
+
+    from instrumentation import METRICS, PROFILER
+
+    with METRICS.timer("predict_proba", disease="Heart"):
+        probs = model.predict_proba(X)
+    METRICS.inc("sher_predictions_total", disease="Heart", risk_level="Low", status="healthy")
+
+METRICS keeps, per label set:
+- counters     sher_predictions_total, sher_rows_scored_total, sher_errors_total
+               (by the stage that raised), sher_failed_requests_total, ...
+- histograms   sher_stage_seconds (one series per stage and disease) and
+               sher_request_seconds, with fixed latency buckets from 0.1 ms to 10 s;
+               sher_batch_size with power-of-two buckets, sher_trees_used (early exit)
+- gauges       sher_batch_queue_depth, sher_batch_inflight
+
+A timer costs a few microseconds (a perf_counter pair, a bisect and a locked dict
+update), about 20 us for the five records of one prediction against the ~3 ms of the
+prediction itself. Set SHER_METRICS=0 to turn recording off entirely.
+
+The numbers are available as Prometheus text (render_prometheus, served by serve.py
+at GET /metrics) and as JSON with estimated p50/p95/p99 per series (snapshot, GET
+/metrics.json, or written every few seconds by start_dump for the Streamlit app).
+
+PROFILER wraps every instrumented prediction in cProfile while it is active, and
+merges the per-call profiles across threads. It is switched at runtime with
+start()/stop() (POST /profile/start and /profile/stop on the server), or by creating
+and deleting the flag file named in SHER_PROFILE_FLAG.
+"""
+import bisect
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds in seconds, as in the Prometheus client defaults plus sub-millisecond buckets
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Histograms of something other than seconds
+METRIC_BUCKETS = {
+    "sher_batch_size": (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048),
+    "sher_trees_used": (8, 16, 24, 32, 48, 64, 96, 128, 256, 512)
+}
+
+HELP = {
+    "sher_stage_seconds": "Time spent in each stage of the prediction path.",
+    "sher_request_seconds": "End-to-end time of a prediction request.",
+    "sher_predictions_total": "Single-patient predictions by disease, risk level and status.",
+    "sher_rows_scored_total": "Patient rows scored in batches, by disease.",
+    "sher_errors_total": "Exceptions raised inside a timed stage, by disease, stage and exception type.",
+    "sher_failed_requests_total": "Prediction requests that ended in an error, by disease or endpoint and exception type.",
+    "sher_http_requests_total": "HTTP requests by endpoint and status code.",
+    "sher_cache_requests_total": "Prediction cache lookups by disease and result (table, hit, disk, miss).",
+    "sher_batch_queue_depth": "Requests waiting in the micro-batching queue, by disease.",
+    "sher_batch_inflight": "Micro-batches being evaluated, by disease.",
+    "sher_batch_size": "Requests per micro-batch, by disease.",
+    "sher_trees_used": "Trees evaluated per early-exit prediction, by disease."
+}
+
+# ==========================================
+# 1. METRICS REGISTRY
+# ==========================================
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class _Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, n_buckets):
+        self.counts = [0] * (n_buckets + 1)  # last bucket is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+class Metrics:
+    """
+    Thread-safe counters and latency histograms keyed by metric name and labels.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS, enabled=None, metric_buckets=None):
+        self.buckets = tuple(buckets)
+        self.metric_buckets = dict(METRIC_BUCKETS if metric_buckets is None else metric_buckets)
+        self.enabled = os.environ.get("SHER_METRICS", "1") != "0" if enabled is None else enabled
+        self.started_at = time.time()
+        self._counters = {}     # (name, labels) -> value
+        self._gauges = {}       # (name, labels) -> value
+        self._histograms = {}   # (name, labels) -> _Histogram
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _labels(labels):
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, self._labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        if not self.enabled:
+            return
+        key = (name, self._labels(labels))
+        with self._lock:
+            self._gauges[key] = value
+
+    def add(self, name, value, **labels):
+        """
+        Move a gauge up or down by value.
+        """
+        if not self.enabled:
+            return
+        key = (name, self._labels(labels))
+        with self._lock:
+            self._gauges[key] = self._gauges.get(key, 0) + value
+
+    def buckets_for(self, name):
+        return self.metric_buckets.get(name, self.buckets)
+
+    def observe(self, name, seconds, **labels):
+        if not self.enabled:
+            return
+        key = (name, self._labels(labels))
+        buckets = self.buckets_for(name)
+        index = bisect.bisect_left(buckets, seconds)
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = _Histogram(len(buckets))
+            hist.counts[index] += 1
+            hist.sum += seconds
+            hist.count += 1
+
+    @contextmanager
+    def timer(self, stage, name="sher_stage_seconds", **labels):
+        """
+        Time the enclosed block into the stage histogram. An exception escaping the
+        block is counted in sher_errors_total with its type and re-raised.
+        """
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.inc("sher_errors_total", stage=stage, error=type(e).__name__, **labels)
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - start, stage=stage, **labels)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+        self.started_at = time.time()
+
+    # ------------------------------------------
+    # Export
+    # ------------------------------------------
+    def _copy(self):
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            histograms = {k: (list(h.counts), h.sum, h.count) for k, h in self._histograms.items()}
+        return counters, gauges, histograms
+
+    def quantile(self, counts, q, buckets=None):
+        """
+        Estimate a quantile from bucket counts by linear interpolation inside the bucket.
+        """
+        buckets = self.buckets if buckets is None else buckets
+        total = sum(counts)
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        for i, c in enumerate(counts):
+            if seen + c >= rank and c:
+                lower = buckets[i - 1] if i > 0 else 0.0
+                upper = buckets[i] if i < len(buckets) else buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / c
+            seen += c
+        return buckets[-1]
+
+    def snapshot(self):
+        """
+        Everything recorded so far as a JSON-serializable dict.
+        """
+        counters, gauges, histograms = self._copy()
+
+        def summary(name, counts, total, count):
+            if name in self.metric_buckets:
+                return {
+                    "sum": total, "mean": total / count if count else None,
+                    **{f"p{int(q * 100)}": self.quantile(counts, q, self.metric_buckets[name]) for q in (0.5, 0.95, 0.99)}
+                }
+            return {
+                "sum_s": total, "mean_ms": total / count * 1000 if count else None,
+                **{f"p{int(q * 100)}_ms": (v * 1000 if v is not None else None)
+                   for q in (0.5, 0.95, 0.99) for v in [self.quantile(counts, q)]}
+            }
+
+        return {
+            "started_at": self.started_at,
+            "uptime_s": time.time() - self.started_at,
+            "counters": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(counters.items())
+            ],
+            "gauges": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(gauges.items())
+            ],
+            "histograms": [
+                {"name": name, "labels": dict(labels), "count": count, **summary(name, counts, total, count)}
+                for (name, labels), (counts, total, count) in sorted(histograms.items())
+            ]
+        }
+
+    def render_prometheus(self):
+        """
+        Prometheus text exposition format (version 0.0.4).
+        """
+        counters, gauges, histograms = self._copy()
+
+        def fmt(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+        lines = []
+        for name in sorted({n for n, _ in counters}):
+            lines += [f"# HELP {name} {HELP.get(name, name)}", f"# TYPE {name} counter"]
+            lines += [f"{name}{fmt(labels)} {value}" for (n, labels), value in sorted(counters.items()) if n == name]
+        for name in sorted({n for n, _ in gauges}):
+            lines += [f"# HELP {name} {HELP.get(name, name)}", f"# TYPE {name} gauge"]
+            lines += [f"{name}{fmt(labels)} {value}" for (n, labels), value in sorted(gauges.items()) if n == name]
+        for name in sorted({n for n, _ in histograms}):
+            lines += [f"# HELP {name} {HELP.get(name, name)}", f"# TYPE {name} histogram"]
+            for (n, labels), (counts, total, count) in sorted(histograms.items()):
+                if n != name:
+                    continue
+                cumulative = 0
+                for bound, c in zip(list(self.buckets_for(name)) + ["+Inf"], counts):
+                    cumulative += c
+                    lines.append(f"{name}_bucket{fmt(labels, [('le', str(bound))])} {cumulative}")
+                lines.append(f"{name}_sum{fmt(labels)} {total}")
+                lines.append(f"{name}_count{fmt(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+        """
+        Write snapshot() to path atomically.
+        """
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(self.snapshot(), fh, indent=2)
+        os.replace(tmp, path)
+
+    def start_dump(self, path, interval=10.0, profiler=None):
+        """
+        Write snapshot() to path every interval seconds from a daemon thread, and
+        the merged profile of profiler (if given) to path + ".prof".
+        """
+        def _loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.dump(path)
+                    if profiler is not None:
+                        profiler.dump(f"{path}.prof")
+                except OSError:
+                    pass
+
+        thread = threading.Thread(target=_loop, name="metrics-dump", daemon=True)
+        thread.start()
+        return thread
+
+# ==========================================
+# 2. PROFILER HOOK
+# ==========================================
+class Profiler:
+    """
+    cProfile around instrumented calls, switchable at runtime.
+
+    cProfile only sees the thread it runs in, so each call is profiled on its own
+    and the results are merged; this covers server thread pools as well as the
+    Streamlit script thread. While inactive the hook costs one attribute check.
+    """
+
+    def __init__(self, flag_path=None, check_interval=1.0):
+        self.flag_path = flag_path
+        self.check_interval = check_interval
+        self._active = False
+        self._flag_checked = 0.0
+        self._flag_on = False
+        self._stats = None
+        self._calls = 0
+        self._lock = threading.Lock()
+
+    @property
+    def active(self):
+        if self._active:
+            return True
+        if self.flag_path is None:
+            return False
+        now = time.monotonic()
+        if now - self._flag_checked >= self.check_interval:
+            self._flag_checked = now
+            self._flag_on = os.path.exists(self.flag_path)
+        return self._flag_on
+
+    def start(self):
+        self._active = True
+
+    def stop(self):
+        self._active = False
+
+    def reset(self):
+        with self._lock:
+            self._stats, self._calls = None, 0
+
+    @contextmanager
+    def profile(self):
+        if not self.active:
+            yield
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is already running in this thread (nested call)
+            yield
+            return
+        try:
+            yield
+        finally:
+            profile.disable()
+            with self._lock:
+                if self._stats is None:
+                    self._stats = pstats.Stats(profile)
+                else:
+                    self._stats.add(profile)
+                self._calls += 1
+
+    def report(self, limit=30, sort="cumulative"):
+        """
+        Text table of the hottest functions over every profiled call so far.
+        """
+        with self._lock:
+            if self._stats is None:
+                return "No profiled calls yet.\n"
+            out = io.StringIO()
+            self._stats.stream = out
+            out.write(f"{self._calls} profiled call(s)\n")
+            self._stats.sort_stats(sort).print_stats(limit)
+            return out.getvalue()
+
+    def dump(self, path):
+        """
+        Write the merged profile in pstats format (snakeviz, pstats.Stats(path)).
+        """
+        with self._lock:
+            if self._stats is not None:
+                self._stats.dump_stats(path)
+
+METRICS = Metrics()
+PROFILER = Profiler(flag_path=os.environ.get("SHER_PROFILE_FLAG"))
+if os.environ.get("SHER_PROFILE") == "1":
+    PROFILER.start()
@@ -0,0 +1,277 @@
+"""
+Local file-based model registry.
+Usage: python model_registry.py [--root registry] list
+       python model_registry.py [--root registry] activate Diabetes v0003
+       python model_registry.py [--root registry] register Diabetes model_Diabetes.sav
+
+Layout:
+
+    registry/
+        <Disease>/
+            v0001/
+                model.sav        fitted model (Pipeline or bare forest)
+                model/           memory-mappable export, loaded first (see forest_arrays.py)
+                model.sherbin    compact export (see compact_forest.py and inference.MODEL_FORMATS)
+                metadata.json    data hash, feature names, classes, metrics, size, load time
+            v0002/ ...
+            CURRENT              name of the version being served
+
+A version directory is written under a temporary name and renamed into place once
+complete, and CURRENT is replaced with os.replace, so readers never see a partial
+version. RegistryModels serves the CURRENT version of every disease and swaps to a
+new one as soon as CURRENT changes: requests already holding the old model finish
+with it, new lookups get the new one, and no process has to restart.
+"""
+import argparse
+import datetime
+import errno
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections.abc import Mapping
+
+import joblib
+import numpy as np
+
+from compact_forest import compact_path, save_compact
+from forest_arrays import save_forest
+from inference import MODEL_FORMATS, load_model_file, model_artifact
+
+MODEL_FILENAME = "model.sav"
+MAX_VERSION_ATTEMPTS = 100  # concurrent registrations tolerated before register() gives up
+
+
+class ModelRegistry:
+    """
+    Versioned model artifacts for every disease under one root directory.
+    """
+
+    def __init__(self, root="registry"):
+        self.root = root
+
+    # ------------------------------------------
+    # Reading
+    # ------------------------------------------
+    def diseases(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(d for d in os.listdir(self.root) if os.path.exists(os.path.join(self.root, d, "CURRENT")))
+
+    def versions(self, disease):
+        folder = os.path.join(self.root, disease)
+        if not os.path.isdir(folder):
+            return []
+        return sorted(
+            v for v in os.listdir(folder)
+            if v.startswith("v") and os.path.exists(os.path.join(folder, v, "metadata.json"))
+        )
+
+    def current_version(self, disease):
+        try:
+            with open(os.path.join(self.root, disease, "CURRENT"), encoding="utf-8") as fh:
+                return fh.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def metadata(self, disease, version=None):
+        version = version or self.current_version(disease)
+        with open(os.path.join(self.root, disease, version, "metadata.json"), encoding="utf-8") as fh:
+            return json.load(fh)
+
+    def model_path(self, disease, version=None):
+        version = version or self.current_version(disease)
+        if version is None:
+            raise KeyError(disease)
+        return os.path.join(self.root, disease, version, MODEL_FILENAME)
+
+    def load(self, disease, version=None, formats=MODEL_FORMATS):
+        return load_model_file(self.model_path(disease, version), formats)
+
+    # ------------------------------------------
+    # Writing
+    # ------------------------------------------
+    def register(self, disease, model, data_hash=None, metrics=None, activate=True, export_arrays=True):
+        """
+        Store a fitted model as the next version of disease and return the version name.
+        """
+        folder = os.path.join(self.root, disease)
+        os.makedirs(folder, exist_ok=True)
+        staging = os.path.join(folder, f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(staging)
+
+        try:
+            model_file = os.path.join(staging, MODEL_FILENAME)
+            joblib.dump(model, model_file)
+            if export_arrays and hasattr(model, "predict_proba"):
+                save_forest(model, os.path.splitext(model_file)[0])
+                try:
+                    save_compact(model, compact_path(model_file))
+                except ValueError:
+                    pass   # preprocessing that needs pickle; the array export is used
+
+            start = time.perf_counter()
+            load_model_file(model_file)
+            load_time = time.perf_counter() - start
+
+            metadata = {
+                "disease": disease,
+                "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                "data_hash": data_hash,
+                "feature_names": [str(c) for c in getattr(model, "feature_names_in_", [])],
+                "classes": np.asarray(getattr(model, "classes_", [])).tolist(),
+                "metrics": metrics or {},
+                "size_bytes": _folder_size(staging),
+                "load_time_s": load_time
+            }
+
+            # Claim the next free version number; a concurrent register() simply takes the one after
+            for attempt in range(MAX_VERSION_ATTEMPTS):
+                existing = [int(v[1:]) for v in os.listdir(folder) if v.startswith("v") and v[1:].isdigit()]
+                version = f"v{max(existing, default=0) + 1:04d}"
+                metadata["version"] = version
+                with open(os.path.join(staging, "metadata.json"), "w", encoding="utf-8") as fh:
+                    json.dump(metadata, fh, indent=2)
+                try:
+                    os.rename(staging, os.path.join(folder, version))
+                    break
+                except OSError as e:
+                    # Only a version taken by someone else is worth another try
+                    if e.errno not in (errno.EEXIST, errno.ENOTEMPTY) or attempt == MAX_VERSION_ATTEMPTS - 1:
+                        raise
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        if activate:
+            self.activate(disease, version)
+        return version
+
+    def activate(self, disease, version):
+        """
+        Atomically point CURRENT at version.
+        """
+        if version not in self.versions(disease):
+            raise KeyError(f"{disease} has no version {version}")
+        pointer = os.path.join(self.root, disease, "CURRENT")
+        tmp = f"{pointer}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            fh.write(version)
+        os.replace(tmp, pointer)
+
+
+def _folder_size(path):
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(dirpath, f)) for f in filenames)
+    return total
+
+
+class RegistryModels(Mapping):
+    """
+    Serves the CURRENT version of every disease in a registry and hot-swaps it.
+
+    Each lookup re-reads CURRENT at most every check_interval seconds. When it
+    points at a new version, that version is loaded first and then swapped in with
+    a single reference assignment, so callers holding the previous model keep
+    using it until they are done.
+    """
+
+    def __init__(self, registry, check_interval=1.0, on_error=None, on_load=None, formats=MODEL_FORMATS):
+        self.registry = registry if isinstance(registry, ModelRegistry) else ModelRegistry(registry)
+        self.check_interval = check_interval
+        self.on_error = on_error
+        self.on_load = on_load
+        self.formats = formats
+        self._active = {}      # disease -> (version, model)
+        self._checked = {}     # disease -> time of last CURRENT read
+        self._lock = threading.Lock()
+        self._load_locks = {}
+
+    def __getitem__(self, disease):
+        now = time.monotonic()
+        active = self._active.get(disease)
+        if active is not None and now - self._checked.get(disease, 0.0) < self.check_interval:
+            return active[1]
+
+        self._checked[disease] = now
+        version = self.registry.current_version(disease)
+        if version is None:
+            raise KeyError(disease)
+        if active is not None and active[0] == version:
+            return active[1]
+
+        with self._lock:
+            load_lock = self._load_locks.setdefault(disease, threading.Lock())
+        with load_lock:
+            active = self._active.get(disease)
+            if active is not None and active[0] == version:
+                return active[1]
+            try:
+                model = self.registry.load(disease, version, self.formats)
+            except Exception as e:
+                if self.on_error is not None:
+                    self.on_error(disease, self.registry.model_path(disease, version), e)
+                if active is not None:
+                    # Keep serving the previous version rather than failing requests
+                    return active[1]
+                raise KeyError(disease) from e
+            if self.on_load is not None:
+                self.on_load(disease, model_artifact(self.registry.model_path(disease, version), self.formats))
+            self._active[disease] = (version, model)
+            return model
+
+    def __contains__(self, disease):
+        return self.registry.current_version(disease) is not None
+
+    def __iter__(self):
+        return iter(self.registry.diseases())
+
+    def __len__(self):
+        return len(self.registry.diseases())
+
+    def versions(self):
+        """
+        {disease: version currently held in memory}
+        """
+        return {d: v for d, (v, _) in self._active.items()}
+
+    def version(self, disease):
+        """
+        Version of disease currently held in memory, or None.
+        """
+        active = self._active.get(disease)
+        return active[0] if active is not None else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect and manage the model registry.")
+    parser.add_argument("--root", default="registry")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list")
+    p_activate = sub.add_parser("activate")
+    p_activate.add_argument("disease")
+    p_activate.add_argument("version")
+    p_register = sub.add_parser("register")
+    p_register.add_argument("disease")
+    p_register.add_argument("model_file")
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.root)
+    if args.command == "list":
+        for disease in registry.diseases():
+            current = registry.current_version(disease)
+            print(f"{disease}:")
+            for version in registry.versions(disease):
+                meta = registry.metadata(disease, version)
+                marker = "*" if version == current else " "
+                print(f"  {marker} {version}  {meta['created_at']}  {meta['size_bytes'] / 1e6:.2f} MB  "
+                      f"load {meta['load_time_s'] * 1000:.0f} ms  metrics {meta['metrics']}")
+    elif args.command == "activate":
+        registry.activate(args.disease, args.version)
+        print(f"✅ {args.disease} now serves {args.version}")
+    else:
+        version = registry.register(args.disease, joblib.load(args.model_file))
+        print(f"✅ Registered {args.model_file} as {args.disease} {version}")
@@ -0,0 +1,172 @@
+"""
+Correlation-preserving oversampling (SMOTE) for any dataset in the training spec.
+Usage: python oversample.py Malaria_Pneumonia --per-class 500 [--seed 42] [--out boosted.csv]
+       python oversample.py Kidney --balance --include-original
+
+Sampling every column on its own (as boost_data.py used to) keeps each column's
+distribution but loses which symptoms occur together. SMOTE instead creates each new
+row between a real row and one of its k nearest neighbours of the same class:
+
+    new = base + gap * (neighbour - base),   gap ~ U(0, 1)
+
+Continuous columns are interpolated (integer-valued ones rounded back to integers);
+binary, categorical and text columns take the value of whichever of the two rows is
+nearer (gap < 0.5), so every generated row mixes two real, similar patients. The
+neighbours come from a KD-tree per class on the standardized numeric columns, and the
+rows of all classes are built together with array operations, so generating 1M rows
+costs a handful of numpy calls per column.
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import KDTree
+
+from trainmodels import SPEC_PATH, load_dataset, load_spec, prepare_dataset
+
+DEFAULT_NEIGHBORS = 5
+
+
+def _is_interpolated(col):
+    """
+    Numeric columns with more than two distinct values are interpolated; the rest are picked.
+    """
+    return (
+        pd.api.types.is_numeric_dtype(col.dtype) and not pd.api.types.is_bool_dtype(col.dtype)
+        and col.nunique(dropna=True) > 2
+    )
+
+
+def _distance_space(X):
+    """
+    Standardized numeric columns (missing values at the column mean) for the KD-trees.
+    """
+    numeric = X.select_dtypes(include="number")
+    if numeric.shape[1] == 0:
+        return np.zeros((len(X), 1))
+    values = numeric.to_numpy(dtype=np.float64)
+    mean = np.nanmean(values, axis=0)
+    std = np.nanstd(values, axis=0)
+    std[~np.isfinite(std) | (std == 0)] = 1.0
+    scaled = (values - np.nan_to_num(mean)) / std
+    return np.nan_to_num(scaled, nan=0.0)
+
+
+def class_targets(y, per_class=None, balance=False):
+    """
+    {class: rows to generate}: per_class rows for every class, or with balance=True as
+    many as each class needs to match the largest one.
+    """
+    counts = y.value_counts()
+    if balance:
+        return {c: int(counts.max() - n) for c, n in counts.items()}
+    if per_class is None:
+        raise ValueError("give per_class or balance=True")
+    return {c: int(per_class) for c in counts.index}
+
+
+def smote(X, y, n_new, k=DEFAULT_NEIGHBORS, seed=None, shuffle=True):
+    """
+    Generate synthetic rows for every class in n_new ({class: count}).
+    Returns (X_new, y_new) with the columns and dtypes of X.
+    """
+    rng = np.random.default_rng(seed)
+    X = X.reset_index(drop=True)
+    y = pd.Series(np.asarray(y), name=getattr(y, "name", None))
+    space = _distance_space(X)
+
+    bases, partners, labels = [], [], []
+    for label, m in n_new.items():
+        rows = np.flatnonzero((y == label).to_numpy())
+        if m <= 0:
+            continue
+        if len(rows) == 0:
+            raise ValueError(f"class {label!r} has no rows to oversample")
+        base = rng.integers(len(rows), size=m)
+        k_c = min(k, len(rows) - 1)
+        if k_c > 0:
+            # First neighbour of every row is the row itself
+            _, neighbours = KDTree(space[rows]).query(space[rows], k=k_c + 1)
+            partner = neighbours[base, 1 + rng.integers(k_c, size=m)]
+        else:
+            partner = base
+        bases.append(rows[base])
+        partners.append(rows[partner])
+        labels.append(np.full(m, label, dtype=object))
+
+    if not bases:
+        return X.iloc[:0].copy(), y.iloc[:0].copy()
+    base, partner = np.concatenate(bases), np.concatenate(partners)
+    label = np.concatenate(labels)
+    gap = rng.random(len(base))
+    if shuffle:
+        order = rng.permutation(len(base))
+        base, partner, label, gap = base[order], partner[order], label[order], gap[order]
+    near_base = gap < 0.5
+
+    columns = {}
+    for c in X.columns:
+        col = X[c]
+        if _is_interpolated(col):
+            a = col.to_numpy(dtype=np.float64)
+            lo, hi = a[base], a[partner]
+            values = lo + gap * (hi - lo)
+            # A missing value on either side: keep the nearer row's value as is
+            values = np.where(np.isnan(values), np.where(near_base, lo, hi), values)
+            if pd.api.types.is_integer_dtype(col.dtype) or np.all(np.isnan(a) | (a == np.round(a))):
+                values = np.round(values)
+            columns[c] = values.astype(col.dtype) if pd.api.types.is_integer_dtype(col.dtype) else values
+        else:
+            a = col.to_numpy()
+            columns[c] = pd.array(np.where(near_base, a[base], a[partner]), dtype=col.dtype)
+
+    X_new = pd.DataFrame(columns, columns=X.columns)
+    y_new = pd.Series(label, name=y.name)
+    if y.dtype != object:
+        y_new = y_new.astype(y.dtype)
+    return X_new, y_new
+
+
+def oversample_disease(disease, per_class=None, balance=False, k=DEFAULT_NEIGHBORS, seed=None,
+                       include_original=False, spec_path=SPEC_PATH):
+    """
+    Load and clean one dataset of the spec exactly as training does, then oversample it.
+    Returns a DataFrame with the features and the target column.
+    """
+    config = load_spec(spec_path)[disease]
+    X, y = prepare_dataset(load_dataset(config), config)
+    X_new, y_new = smote(X, y, class_targets(y, per_class, balance), k=k, seed=seed)
+    synthetic = X_new.assign(**{config['target']: y_new.to_numpy()})
+    if include_original:
+        original = X.assign(**{config['target']: y.to_numpy()})
+        synthetic = pd.concat([original, synthetic], ignore_index=True)
+    return synthetic
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Oversample a training dataset with SMOTE.")
+    parser.add_argument("disease", help="Disease in the training spec")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--per-class", type=int, help="Synthetic rows to generate for every class")
+    group.add_argument("--balance", action="store_true", help="Generate rows until every class matches the largest")
+    parser.add_argument("--neighbors", type=int, default=DEFAULT_NEIGHBORS, help="k nearest neighbours per row")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--include-original", action="store_true", help="Write the real rows before the synthetic ones")
+    parser.add_argument("--spec", default=SPEC_PATH)
+    parser.add_argument("--out", help="Output CSV (default: <dataset>_Oversampled.csv)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    try:
+        df = oversample_disease(args.disease, args.per_class, args.balance, args.neighbors, args.seed,
+                                args.include_original, args.spec)
+    except FileNotFoundError as e:
+        print(f"❌ Error: File not found at {e.filename or e}")
+        raise SystemExit(1)
+    elapsed = time.perf_counter() - start
+    out = args.out or os.path.splitext(load_spec(args.spec)[args.disease]['path'])[0] + "_Oversampled.csv"
+    df.to_csv(out, index=False)
+    print(f"✅ {len(df):,} rows for {args.disease} in {elapsed:.2f}s")
+    print(f"📂 Saved to: {out}")
@@ -0,0 +1,322 @@
+"""
+Prediction cache in front of inference.predict.
+
+    cache = PredictionCache(max_entries=4096, ttl=3600, db_path="predictions.db")
+    result = cache.predict("Heart", models["Heart"], features, model_version(models, "Heart"))
+
+Streamlit reruns the whole page on every widget change and the same patients come
+back to the server again and again, so results are remembered under
+(disease, model version, mode, quantized feature vector):
+- the features are rounded to `decimals` places, with missing values kept apart from 0
+- the model version (the registry version, or the model file's name, mtime and size)
+  changes as soon as a different model is served, so results are never reused across models
+- the mode names how the result was computed (None for the full forest, see
+  early_exit.cache_mode), so approximate results are never served for exact ones
+
+Entries are kept in an in-process LRU dict of at most max_entries, and expire after
+ttl seconds if given. With db_path they are also written to a SQLite file, which every
+server worker and app session on the machine reads before evaluating a forest.
+
+Models whose inputs are all binary (Malaria_Pneumonia: 12 symptoms, 4,096 possible
+patients) get a LookupTable instead: the forest is evaluated once on every possible
+input, and each prediction afterwards is an array index.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import inference
+from instrumentation import METRICS
+
+DEFAULT_MAX_ENTRIES = 4096
+DEFAULT_DISK_ENTRIES = 100_000
+DEFAULT_DECIMALS = 4
+LOOKUP_TABLE_DISEASES = ("Malaria_Pneumonia",)
+MAX_TABLE_INPUTS = 16   # 65,536 rows
+
+# ==========================================
+# 1. KEYS
+# ==========================================
+def model_version(models, name):
+    """
+    Version of the model currently served for name, if the model mapping tracks one.
+    """
+    version = getattr(models, "version", None)
+    return version(name) if version is not None else None
+
+def _as_float(features):
+    if isinstance(features, pd.DataFrame):
+        return features.to_numpy(dtype=np.float64)   # 3x faster than np.asarray on a frame
+    return np.asarray(features, dtype=np.float64)
+
+def feature_keys(features, decimals=DEFAULT_DECIMALS):
+    """
+    Digest of every row of a feature matrix (DataFrame or 2-D array) after rounding
+    to decimals places.
+    """
+    columns = tuple(str(c) for c in features.columns) if isinstance(features, pd.DataFrame) else ()
+    header = repr(columns).encode("utf-8")
+    try:
+        values = _as_float(features)
+    except (TypeError, ValueError):
+        # Text inputs (e.g. "Male") are hashed as given
+        rows = np.asarray(features, dtype=object)
+        return [hashlib.blake2b(header + repr(row.tolist()).encode("utf-8"), digest_size=16).hexdigest() for row in rows]
+    missing = np.isnan(values)
+    values = np.round(np.where(missing, 0.0, values), decimals) + 0.0   # -0.0 -> 0.0
+    shape = repr((1, values.shape[1])).encode("ascii")
+    keys = []
+    for row, row_missing in zip(values, missing):
+        digest = hashlib.blake2b(header, digest_size=16)
+        digest.update(shape)
+        digest.update(row.tobytes())
+        digest.update(np.packbits(row_missing).tobytes())
+        keys.append(digest.hexdigest())
+    return keys
+
+def feature_key(features, decimals=DEFAULT_DECIMALS):
+    """
+    Digest of a single feature row.
+    """
+    return feature_keys(features, decimals)[0]
+
+# ==========================================
+# 2. LOOKUP TABLES
+# ==========================================
+class LookupTable:
+    """
+    predict() of a model with n binary inputs for all 2**n possible patients.
+
+    The whole grid is scored with one predict_proba call when the table is built
+    (about 65 ms for Malaria_Pneumonia). index() maps a feature row to its row of
+    the grid, or returns None when an input is missing or not 0/1.
+    """
+
+    def __init__(self, model_name, model):
+        n = int(model.n_features_in_)
+        if n > MAX_TABLE_INPUTS:
+            raise ValueError(f"{model_name} has {n} inputs; lookup tables support at most {MAX_TABLE_INPUTS}")
+        codes = np.arange(2 ** n)
+        grid = ((codes[:, None] >> np.arange(n)) & 1).astype(np.float64)
+        if inference.uses_named_inputs(model):
+            grid = pd.DataFrame(grid, columns=list(model.feature_names_in_))
+        probs = model.predict_proba(grid)
+        labels = model.classes_[np.argmax(probs, axis=1)]
+        self.n_inputs = n
+        self.weights = 1 << np.arange(n)
+        self.results = [inference.describe_prediction(model_name, model, labels[i], probs[i]) for i in codes]
+
+    def index(self, features):
+        return self.indices(features)[0]
+
+    def indices(self, features):
+        """
+        index() of every row of a feature matrix.
+        """
+        try:
+            values = _as_float(features)
+        except (TypeError, ValueError):
+            return [None] * len(features)
+        if values.ndim != 2 or values.shape[1] != self.n_inputs:
+            return [None] * len(values)
+        binary = np.all((values == 0) | (values == 1), axis=1)
+        codes = values @ self.weights
+        return [int(code) if ok else None for code, ok in zip(codes, binary)]
+
+# ==========================================
+# 3. SHARED DISK BACKEND
+# ==========================================
+class SQLiteBackend:
+    """
+    Results shared between processes through one SQLite file (WAL mode).
+
+    Every thread gets its own connection. Reads past ttl count as misses, and every
+    256 writes the oldest entries beyond max_entries are removed. Database errors
+    (e.g. a locked file) are treated as misses so a prediction never fails on them.
+    """
+
+    def __init__(self, path, max_entries=DEFAULT_DISK_ENTRIES, ttl=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._local = threading.local()
+        self._writes = 0
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS predictions (key TEXT PRIMARY KEY, result TEXT NOT NULL, created REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS predictions_created ON predictions (created)")
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        try:
+            row = self._connection().execute("SELECT result, created FROM predictions WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error:
+            return None
+        if row is None or (self.ttl is not None and time.time() - row[1] > self.ttl):
+            return None
+        return json.loads(row[0])
+
+    def set(self, key, result):
+        try:
+            conn = self._connection()
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO predictions VALUES (?, ?, ?)", (key, json.dumps(result), time.time()))
+            self._writes += 1
+            if self._writes % 256 == 0:
+                self.prune()
+        except sqlite3.Error:
+            pass
+
+    def prune(self):
+        conn = self._connection()
+        with conn:
+            if self.ttl is not None:
+                conn.execute("DELETE FROM predictions WHERE created < ?", (time.time() - self.ttl,))
+            if self.max_entries is not None:
+                conn.execute(
+                    "DELETE FROM predictions WHERE key IN "
+                    "(SELECT key FROM predictions ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+
+    def clear(self):
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM predictions")
+
+# ==========================================
+# 4. CACHE
+# ==========================================
+class PredictionCache:
+    """
+    LRU (+ optional TTL) cache of predict() results, with lookup tables for binary models.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=None, db_path=None, decimals=DEFAULT_DECIMALS,
+                 lookup_tables=LOOKUP_TABLE_DISEASES, disk_entries=DEFAULT_DISK_ENTRIES):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.decimals = decimals
+        self.lookup_tables = set(lookup_tables or ())
+        self.backend = SQLiteBackend(db_path, disk_entries, ttl) if db_path else None
+        self._entries = OrderedDict()   # key -> (expires_at, result)
+        self._tables = {}               # disease -> (version, LookupTable)
+        self._lock = threading.Lock()
+        self._table_lock = threading.Lock()
+
+    def predict(self, model_name, model, features, version=None, predictor=None, mode=None):
+        """
+        inference.predict(model_name, model, features), from the cache when possible.
+        Without a version nothing is cached (lookup tables are still used), since the
+        id() of a garbage-collected model can be reused by the next one loaded. predictor replaces inference.predict on a miss; its
+        results are stored apart from exact ones under mode.
+        """
+        (result,), (key,) = self.lookup_rows(model_name, model, features, version, mode)
+        if result is None:
+            result = (predictor or inference.predict)(model_name, model, features)
+            self.store(key, result)
+        return dict(result)
+
+    def lookup_rows(self, model_name, model, features, version=None, mode=None):
+        """
+        Cached results for every row of a feature matrix, None where there is none,
+        and the keys to store() the missing results under once they are computed.
+        Lookup tables hold full-forest results, which are served in every mode.
+        Without a version every row is a miss and its key is None (store() skips it).
+        """
+        n = len(features)
+        results, keys = [None] * n, [None] * n
+
+        todo = range(n)
+        if model_name in self.lookup_tables:
+            # Unversioned tables are tied to the model object itself (never to its id())
+            table = self.table(model_name, model, version if version is not None else model)
+            todo = []
+            for i, index in enumerate(table.indices(features)):
+                if index is None:
+                    todo.append(i)
+                else:
+                    results[i] = dict(table.results[index])
+                    METRICS.inc("sher_cache_requests_total", disease=model_name, result="table")
+            if not todo:
+                return results, keys
+        if version is None:
+            for _ in todo:
+                METRICS.inc("sher_cache_requests_total", disease=model_name, result="uncached")
+            return results, keys
+
+        if mode:
+            version = f"{version}|{mode}"
+        digests = feature_keys(features, self.decimals)
+        for i in todo:
+            key = f"{model_name}|{version}|{digests[i]}"
+            result, source = self._get(key), "hit"
+            if result is None and self.backend is not None:
+                result, source = self.backend.get(key), "disk"
+                if result is not None:
+                    self._set(key, result)
+            METRICS.inc("sher_cache_requests_total", disease=model_name, result=source if result is not None else "miss")
+            results[i] = dict(result) if result is not None else None
+            keys[i] = key
+        return results, keys
+
+    def store(self, key, result):
+        if key is None:
+            return
+        self._set(key, result)
+        if self.backend is not None:
+            self.backend.set(key, result)
+
+    def table(self, model_name, model, version):
+        """
+        The lookup table of model_name for this model version, built on first use.
+        """
+        entry = self._tables.get(model_name)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        with self._table_lock:
+            entry = self._tables.get(model_name)
+            if entry is None or entry[0] != version:
+                entry = self._tables[model_name] = (version, LookupTable(model_name, model))
+            return entry[1]
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] is not None and entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def _set(self, key, result):
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (expires_at, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        self._tables.clear()
+        if self.backend is not None:
+            self.backend.clear()
+
+    def __len__(self):
+        return len(self._entries)
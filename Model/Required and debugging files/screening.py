@@ -0,0 +1,160 @@
+"""
+Full screening: one patient record, every disease model.
+Usage: python screening.py '{"age": 54, "sex": 1, "bmi": 31.2, "glucose": 150, "systolic_bp": 145}' [--model-dir .]
+
+The record uses the app's form field names (glucose, bmi, cough, sc, ...). Values
+the forms ask for under different names per disease have one unified name:
+
+    sex           -> Heart sex, Liver gender, Hypertension sex   (1 = male)
+    systolic_bp   -> Heart trestbps, Kidney bp, Hypertension sys_bp
+    diastolic_bp  -> Diabetes bp, Hypertension dia_bp
+    cholesterol   -> Heart chol, Hypertension chol
+    smoker        -> Hypertension smoke
+
+Pipelines from trainmodels.py impute the inputs that are not given; bare forests
+(such as the bundled core_models) get 0 for them, like the per-disease forms, and
+the result reports how many inputs were actually given (inputs_used / inputs_total).
+
+Every model that gets at least one of its inputs is evaluated, all of them at once
+in a thread pool (numpy releases the GIL inside the forest evaluation), so a
+screening takes about as long as the slowest model rather than the sum of all six.
+The results are combined into one risk profile: the diseases flagged Moderate or
+High, highest probability first.
+"""
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import inference
+from early_exit import cache_mode, predict_anytime
+from prediction_cache import model_version
+
+SHARED_FIELDS = {
+    "sex": {"Heart": "sex", "Liver": "gender", "Hypertension": "sex"},
+    "systolic_bp": {"Heart": "trestbps", "Kidney": "bp", "Hypertension": "sys_bp"},
+    "diastolic_bp": {"Diabetes": "bp", "Hypertension": "dia_bp"},
+    "cholesterol": {"Heart": "chol", "Hypertension": "chol"},
+    "smoker": {"Hypertension": "smoke"}
+}
+
+_executor = None
+
+def _shared_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=len(inference.MODEL_FILES), thread_name_prefix="screening")
+    return _executor
+
+# ==========================================
+# 1. ONE DISEASE
+# ==========================================
+def form_fields(disease, model):
+    """
+    The form fields a model takes.
+    """
+    if inference.uses_named_inputs(model):
+        return set(inference.named_inputs(disease, model).values())
+    return {field for field, _ in inference.FEATURE_LAYOUTS.get(disease, [])}
+
+def disease_record(disease, record):
+    """
+    The fields of a unified record as the form of one disease names them. Fields
+    given under the form's own name win over the unified ones.
+    """
+    out = {k: v for k, v in record.items() if k not in SHARED_FIELDS}
+    for shared, targets in SHARED_FIELDS.items():
+        if shared in record and disease in targets:
+            out.setdefault(targets[disease], record[shared])
+    return {k: v for k, v in out.items() if v is not None}
+
+def screen_disease(models, disease, record, cache=None, early_exit=None):
+    """
+    Evaluate one model on a unified record, with early exit at that delta if given.
+    Returns (disease, result or None if none of its inputs were given, inputs used / inputs total).
+    """
+    model = models[disease]
+    fields = form_fields(disease, model)
+    given = disease_record(disease, record)
+    used = len(fields & set(given)) if fields else len(given)
+    if not used:
+        return disease, None, (0, len(fields))
+    if not inference.uses_named_inputs(model):
+        # Bare forests take every form field; the ones not given are zero, like the
+        # defaults of the per-disease forms
+        given = {field: given.get(field, 0) for field in fields}
+    features = inference.build_features(disease, model, given)
+    predictor = inference.predict
+    if early_exit:
+        predictor = lambda name, model, features: predict_anytime(name, model, features, early_exit)
+    if cache is not None:
+        result = cache.predict(disease, model, features, model_version(models, disease), predictor, cache_mode(early_exit))
+    else:
+        result = predictor(disease, model, features)
+    return disease, result, (used, len(fields))
+
+# ==========================================
+# 2. ALL DISEASES
+# ==========================================
+def combine(outcomes, errors=None):
+    """
+    Risk profile from the (disease, result, coverage) tuples of screen_disease.
+    """
+    results, skipped = {}, []
+    for disease, result, (used, total) in outcomes:
+        if result is None:
+            skipped.append(disease)
+            continue
+        results[disease] = {**result, "inputs_used": used, "inputs_total": total}
+    order = sorted(results, key=lambda d: results[d]["probability"], reverse=True)
+    flagged = [d for d in order if results[d]["risk_level"] != "Low"]
+    return {
+        "results": {d: results[d] for d in order},
+        "flagged": flagged,
+        "highest_risk": order[0] if order else None,
+        "risk_counts": {level: sum(r["risk_level"] == level for r in results.values()) for level in inference.RISK_LEVELS},
+        "skipped": skipped,
+        "errors": errors or {}
+    }
+
+def screen_patient(models, record, diseases=None, cache=None, executor=None, early_exit=None):
+    """
+    Evaluate every model (or diseases) on one unified record concurrently and
+    return the combined risk profile. A model that fails to load or rejects its
+    inputs is listed under "errors" instead of failing the screening.
+    """
+    diseases = [d for d in (diseases or list(models)) if d in models]
+    executor = executor or _shared_executor()
+    futures = {d: executor.submit(screen_disease, models, d, record, cache, early_exit) for d in diseases}
+    outcomes, errors = [], {}
+    for disease, future in futures.items():
+        try:
+            outcomes.append(future.result())
+        except (KeyError, TypeError, ValueError) as e:
+            errors[disease] = str(e) or type(e).__name__
+    return combine(outcomes, errors)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Screen one patient for every disease.")
+    parser.add_argument("record", help="Patient record as JSON (or @file.json)")
+    parser.add_argument("--model-dir", default=".", help="Folder containing the model_<Disease>.sav files")
+    args = parser.parse_args()
+
+    if args.record.startswith("@"):
+        with open(args.record[1:], encoding="utf-8") as fh:
+            record = json.load(fh)
+    else:
+        record = json.loads(args.record)
+    models = inference.load_models(args.model_dir)
+    start = time.perf_counter()
+    profile = screen_patient(models, record)
+    elapsed = time.perf_counter() - start
+
+    for disease, r in profile["results"].items():
+        print(f"{disease:<20}{r['risk_level']:<10}{r['probability']:>6.0%}  {r['summary']}  "
+              f"({r['inputs_used']}/{r['inputs_total']} inputs)")
+    for disease, error in profile["errors"].items():
+        print(f"❌ {disease}: {error}")
+    if profile["skipped"]:
+        print(f"⏭️ No inputs for: {', '.join(profile['skipped'])}")
+    print(f"✅ Screened in {elapsed * 1000:.1f} ms")
@@ -0,0 +1,406 @@
+"""
+Headless HTTP/JSON inference server for the disease models.
+Usage: python serve.py [--host 0.0.0.0] [--port 8000] [--workers 4] [--threads 4] [--model-dir .] [--registry registry]
+
+Endpoints:
+- GET  /health               -> status and the list of loaded models
+- POST /predict/{disease}    -> body: form fields of one patient, e.g. {"glucose": 120, "bmi": 31.2, ...}
+- POST /predict/batch        -> body: {"patients": [{...}, ...], "diseases": ["Heart", ...] (optional)}
+- POST /screen               -> body: {"patient": {...}, "diseases": [...] (optional)}; every model on one
+                                patient at once, combined into a risk profile (see screening.py)
+- GET  /metrics              -> stage latency histograms and counters, Prometheus text format
+- GET  /metrics.json         -> the same with p50/p95/p99 per series, as JSON
+- POST /profile/start        -> profile every prediction from now on (cProfile, previous profile discarded)
+- POST /profile/stop         -> stop profiling and return the hottest functions
+- GET  /profile              -> the hottest functions profiled so far
+
+With --batch-wait-ms, concurrent POST /predict/{disease} requests are coalesced per
+disease for up to that many milliseconds (or --max-batch requests) and evaluated with
+one predict_proba call (see batching.py).
+Single-patient results are cached per model version (--prediction-cache entries, 0
+to turn off); --prediction-cache-db shares them between workers through SQLite.
+With --early-exit DELTA, the forests of POST /predict/{disease} (micro-batched or not)
+and /screen stop adding trees once the risk band is settled with probability 1 - DELTA,
+and every result reports trees_used (see early_exit.py). Cached early-exit results are
+kept apart from full-forest ones. It pays off in micro-batches; on single rows it is
+usually slower than the full forest, so combine it with --batch-wait-ms.
+POST /predict/batch always evaluates the full forest.
+
+Models are loaded once per worker process, on first use (or at startup with --preload). With --workers > 1 each worker binds the
+same port (SO_REUSEPORT) and the kernel spreads incoming connections between them.
+Each model is read from its memory-mappable export (model_<Disease>/, shared by all
+workers through the page cache), else its compact export (model_<Disease>.sherbin,
+smallest and fastest to load but a private copy per worker), else the .sav, skipping
+exports older than the .sav; --model-formats changes the order (see
+inference.MODEL_FORMATS). The file used is logged to stderr.
+With --registry the CURRENT version of every disease in a model_registry.py folder is
+served, and a newly activated version replaces the old one without a restart.
+Metrics and the profiler are per worker process: with --workers > 1 a scrape or
+/profile call reaches whichever worker accepted the connection, so use --metrics-dump
+to have every worker write its own <path>.<pid>.json file.
+Only the standard library is used for the server itself.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import sys
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import inference
+from batching import DEFAULT_MAX_BATCH, MicroBatcher
+from early_exit import cache_mode, predict_anytime
+from instrumentation import METRICS, PROFILER
+from prediction_cache import PredictionCache, model_version
+from screening import combine, screen_disease
+
+MAX_BODY_BYTES = 64 * 1024 * 1024
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# ==========================================
+# 1. APPLICATION
+# ==========================================
+class InferenceApp:
+    """
+    Routes requests to the models. Model calls run in a thread pool so the event
+    loop keeps accepting connections while a forest is being evaluated.
+    """
+
+    def __init__(self, models, threads=4, cache=None, batch_wait=None, max_batch=DEFAULT_MAX_BATCH, early_exit=None):
+        self.models = models
+        self.cache = cache
+        self.early_exit = early_exit
+        self.predictor = inference.predict
+        if early_exit:
+            self.predictor = lambda name, model, features: predict_anytime(name, model, features, early_exit)
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+        self.batcher = MicroBatcher(models, self.executor, batch_wait, max_batch, cache, early_exit) if batch_wait else None
+
+    async def handle(self, method, path, body):
+        parts = [p for p in path.split("/") if p]
+
+        if parts == ["health"]:
+            return 200, {"status": "ok", "models": list(self.models.keys())}
+        if parts == ["metrics"]:
+            return 200, METRICS.render_prometheus()
+        if parts == ["metrics.json"]:
+            return 200, METRICS.snapshot()
+        if parts and parts[0] == "profile":
+            return self.handle_profile(method, parts[1:])
+
+        is_screen = parts == ["screen"]
+        if not is_screen and (len(parts) != 2 or parts[0] != "predict"):
+            raise HTTPError(404, f"Unknown endpoint: {path}")
+        if method != "POST":
+            raise HTTPError(405, "Use POST for predictions")
+
+        try:
+            payload = json.loads(body or b"{}")
+        except json.JSONDecodeError as e:
+            raise HTTPError(400, f"Invalid JSON: {e}")
+        if not isinstance(payload, dict):
+            raise HTTPError(400, "Request body must be a JSON object")
+
+        loop = asyncio.get_running_loop()
+        if is_screen:
+            return 200, await self.screen(payload)
+        if parts[1] == "batch":
+            return 200, await loop.run_in_executor(self.executor, self.predict_batch, payload)
+        if self.batcher is not None:
+            return 200, await self.predict_batched(parts[1], payload)
+        return 200, await loop.run_in_executor(self.executor, self.predict_one, parts[1], payload)
+
+    def handle_profile(self, method, action):
+        if action == [] and method == "GET":
+            return 200, PROFILER.report()
+        if action == ["start"] and method == "POST":
+            PROFILER.reset()
+            PROFILER.start()
+            return 200, {"profiling": True}
+        if action == ["stop"] and method == "POST":
+            PROFILER.stop()
+            return 200, PROFILER.report()
+        raise HTTPError(404, f"Unknown endpoint: /profile/{'/'.join(action)}")
+
+    def endpoint(self, path):
+        """
+        Metrics label for a request path, without unbounded values such as unknown diseases.
+        """
+        parts = [p for p in path.split("/") if p]
+        if len(parts) == 2 and parts[0] == "predict" and (parts[1] == "batch" or parts[1] in self.models):
+            return "/" + "/".join(parts)
+        if parts in (["screen"], ["health"], ["metrics"], ["metrics.json"], ["profile"], ["profile", "start"], ["profile", "stop"]):
+            return "/" + "/".join(parts)
+        return "other"
+
+    async def predict_batched(self, disease, record):
+        if disease not in self.models:
+            raise HTTPError(404, f"Model {disease} not found")
+        try:
+            return await self.batcher.predict(disease, record)
+        except (TypeError, ValueError) as e:
+            raise HTTPError(400, str(e))
+
+    def predict_one(self, disease, record):
+        if disease not in self.models:
+            raise HTTPError(404, f"Model {disease} not found")
+        with METRICS.timer("model_lookup", disease=disease):
+            model = self.models[disease]
+        try:
+            features = inference.build_features(disease, model, record)
+        except (TypeError, ValueError) as e:
+            raise HTTPError(400, str(e))
+        if self.cache is not None:
+            return self.cache.predict(disease, model, features, model_version(self.models, disease), self.predictor,
+                                      cache_mode(self.early_exit))
+        return self.predictor(disease, model, features)
+
+    async def screen(self, payload):
+        """
+        All models on one patient, each in its own pool thread, awaited together.
+        """
+        record = payload.get("patient")
+        if not isinstance(record, dict) or not record:
+            raise HTTPError(400, "'patient' must be a non-empty record")
+        diseases = payload.get("diseases") or list(self.models.keys())
+        unknown = [d for d in diseases if d not in self.models]
+        if unknown:
+            raise HTTPError(404, f"Models not found: {', '.join(unknown)}")
+
+        loop = asyncio.get_running_loop()
+        outcomes = await asyncio.gather(
+            *(loop.run_in_executor(self.executor, screen_disease, self.models, d, record, self.cache, self.early_exit)
+              for d in diseases),
+            return_exceptions=True
+        )
+        errors = {}
+        for disease, outcome in zip(diseases, outcomes):
+            if isinstance(outcome, (KeyError, TypeError, ValueError)):
+                errors[disease] = str(outcome) or type(outcome).__name__
+            elif isinstance(outcome, BaseException):
+                raise outcome
+        return combine([o for o in outcomes if not isinstance(o, BaseException)], errors)
+
+    def predict_batch(self, payload):
+        patients = payload.get("patients")
+        if not isinstance(patients, list) or not patients:
+            raise HTTPError(400, "'patients' must be a non-empty list of records")
+
+        diseases = payload.get("diseases") or list(self.models.keys())
+        unknown = [d for d in diseases if d not in self.models]
+        if unknown:
+            raise HTTPError(404, f"Models not found: {', '.join(unknown)}")
+
+        results, skipped = inference.score_frame({d: self.models[d] for d in diseases}, pd.DataFrame(patients))
+
+        scored = [d for d in diseases if d not in skipped]
+        columns = {
+            d: (results[f"{d}_prediction"].tolist(), results[f"{d}_probability"].tolist(), results[f"{d}_risk"].tolist())
+            for d in scored
+        }
+        rows = [
+            {d: {"prediction": columns[d][0][i], "probability": columns[d][1][i], "risk_level": columns[d][2][i]}
+             for d in scored}
+            for i in range(len(results))
+        ]
+        return {"results": rows, "skipped": skipped}
+
+
+# ==========================================
+# 2. HTTP PROTOCOL
+# ==========================================
+async def read_request(reader):
+    """
+    Read one HTTP/1.x request. Returns None when the client closed the connection.
+    """
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    try:
+        method, target, version = request_line.decode("latin-1").split()
+    except ValueError:
+        raise HTTPError(400, "Malformed request line")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get("content-length", 0) or 0)
+    except ValueError:
+        raise HTTPError(400, "Malformed Content-Length header")
+    if length < 0:
+        raise HTTPError(400, "Negative Content-Length header")
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413, "Request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target.split("?", 1)[0], version, headers, body
+
+
+def write_response(writer, status, payload, keep_alive):
+    # Text payloads (metrics, profiles) are sent as is, everything else as JSON
+    if isinstance(payload, str):
+        data, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+    else:
+        data, content_type = json.dumps(payload).encode("utf-8"), "application/json"
+    head = (
+        f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(data)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    writer.write(head.encode("latin-1") + data)
+
+
+async def handle_connection(app, reader, writer):
+    try:
+        while True:
+            keep_alive = False
+            path = None
+            try:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                start = time.perf_counter()
+                method, path, version, headers, body = request
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection == "keep-alive" or (version == "HTTP/1.1" and connection != "close")
+                status, payload = await app.handle(method, path, body)
+            except HTTPError as e:
+                status, payload = e.status, {"error": str(e)}
+            except (asyncio.IncompleteReadError, ConnectionError):
+                break
+            except Exception as e:
+                status, payload = 500, {"error": f"An error occurred: {e}"}
+                METRICS.inc("sher_failed_requests_total", endpoint=app.endpoint(path or ""), error=type(e).__name__)
+                traceback.print_exc(file=sys.stderr)
+
+            if path is not None:
+                endpoint = app.endpoint(path)
+                METRICS.inc("sher_http_requests_total", endpoint=endpoint, status=status)
+                METRICS.observe("sher_request_seconds", time.perf_counter() - start, endpoint=endpoint)
+            write_response(writer, status, payload, keep_alive)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+# ==========================================
+# 3. WORKERS
+# ==========================================
+async def serve(app, host, port, reuse_port=False):
+    server = await asyncio.start_server(
+        lambda r, w: handle_connection(app, r, w), host, port, reuse_port=reuse_port
+    )
+    async with server:
+        await server.serve_forever()
+
+
+def run_worker(host, port, model_dir, threads, reuse_port, max_bytes=None, preload=False, registry=None,
+               metrics_dump=None, metrics_interval=10.0, cache_options=None, batch_options=None, early_exit=None,
+               formats=inference.MODEL_FORMATS):
+    if metrics_dump:
+        if reuse_port:
+            root, ext = os.path.splitext(metrics_dump)
+            metrics_dump = f"{root}.{os.getpid()}{ext or '.json'}"
+        METRICS.start_dump(metrics_dump, metrics_interval, profiler=PROFILER)
+    models = inference.load_models(
+        model_dir,
+        max_bytes=max_bytes,
+        preload=preload,
+        registry=registry,
+        formats=formats,
+        on_error=lambda name, filename, e: print(f"⚠️ Could not load {name} model from '{filename}': {e}", file=sys.stderr),
+        on_load=lambda name, path: print(f"📦 Loaded {name} model from '{path}'", file=sys.stderr)
+    )
+    cache = PredictionCache(**cache_options) if cache_options else None
+    app = InferenceApp(models, threads=threads, cache=cache, early_exit=early_exit, **(batch_options or {}))
+    try:
+        asyncio.run(serve(app, host, port, reuse_port=reuse_port))
+    except KeyboardInterrupt:
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the disease models over HTTP/JSON.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1, help="Number of server processes")
+    parser.add_argument("--threads", type=int, default=4, help="Prediction threads per worker")
+    parser.add_argument("--model-dir", default=".", help="Folder containing the model_<Disease>.sav files")
+    parser.add_argument("--cache-mb", type=float, help="Memory budget for loaded models (LRU eviction)")
+    parser.add_argument("--preload", action="store_true", help="Load all models in the background at startup")
+    parser.add_argument("--registry", help="Serve the CURRENT versions from this model registry folder instead")
+    parser.add_argument("--model-formats", type=inference.parse_formats, default=inference.MODEL_FORMATS,
+                        help="Exports to load instead of the .sav, in order (default: arrays,compact; pickle: always the .sav)")
+    parser.add_argument("--metrics-dump", help="Write the metrics JSON here every --metrics-interval seconds (one file per worker)")
+    parser.add_argument("--metrics-interval", type=float, default=10.0)
+    parser.add_argument("--prediction-cache", type=int, default=4096, help="Cached single-patient results per worker (0 to disable)")
+    parser.add_argument("--prediction-cache-ttl", type=float, help="Seconds a cached result stays valid (default: until evicted)")
+    parser.add_argument("--prediction-cache-db", help="SQLite file shared by all workers for cached results")
+    parser.add_argument("--batch-wait-ms", type=float, default=0.0,
+                        help="Coalesce concurrent single-patient requests for up to this long (0: no batching)")
+    parser.add_argument("--max-batch", type=int, default=DEFAULT_MAX_BATCH, help="Largest micro-batch")
+    parser.add_argument("--early-exit", type=float, metavar="DELTA",
+                        help="Stop evaluating trees once the risk band is settled with probability 1 - DELTA (e.g. 0.001)")
+    args = parser.parse_args(argv)
+    max_bytes = int(args.cache_mb * 1024 * 1024) if args.cache_mb else None
+    cache_options = None
+    if args.prediction_cache > 0:
+        cache_options = {"max_entries": args.prediction_cache, "ttl": args.prediction_cache_ttl, "db_path": args.prediction_cache_db}
+    batch_options = {"batch_wait": args.batch_wait_ms / 1000, "max_batch": args.max_batch} if args.batch_wait_ms > 0 else None
+    if args.early_exit and not batch_options:
+        print("⚠️ --early-exit without --batch-wait-ms evaluates every request on its own, which is usually "
+              "slower than the full forest.", file=sys.stderr)
+
+    workers = max(1, args.workers)
+    if workers > 1 and not hasattr(socket, "SO_REUSEPORT"):
+        print("⚠️ SO_REUSEPORT is not available on this platform; running a single worker.", file=sys.stderr)
+        workers = 1
+
+    print(f"🚀 Serving on http://{args.host}:{args.port} with {workers} worker(s)")
+    if workers == 1:
+        run_worker(args.host, args.port, args.model_dir, args.threads, False, max_bytes, args.preload, args.registry,
+                   args.metrics_dump, args.metrics_interval, cache_options, batch_options, args.early_exit, args.model_formats)
+        return
+
+    processes = [
+        multiprocessing.Process(target=run_worker, args=(args.host, args.port, args.model_dir, args.threads, True, max_bytes, args.preload, args.registry,
+                                                         args.metrics_dump, args.metrics_interval, cache_options, batch_options, args.early_exit,
+                                                         args.model_formats))
+        for _ in range(workers)
+    ]
+    for p in processes:
+        p.start()
+    try:
+        for p in processes:
+            p.join()
+    except KeyboardInterrupt:
+        for p in processes:
+            p.terminate()
+
+
+if __name__ == "__main__":
+    main()
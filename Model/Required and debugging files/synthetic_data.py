@@ -0,0 +1,163 @@
+"""
+Vectorized synthetic patient generator.
+Usage: python synthetic_data.py out.csv [--rows 1000] [--seed 42] [--chunk-rows 1000000] [--table table.json]
+
+Rows are drawn from a per-class symptom probability table:
+
+    {"Malaria":   {"high_fever": 0.9, "chills": 0.95, ...},
+     "Pneumonia": {"high_fever": 0.8, "chills": 0.2, ...}}
+
+Every value is P(symptom = 1 | class). For a chunk of n rows the class labels are laid
+out in proportion to the class weights and shuffled, then the whole (n, n_symptoms)
+matrix is drawn with one call to a seeded numpy Generator and compared against the
+probability rows of the labels. Chunk i is drawn from child i of SeedSequence(seed), so
+the same seed and chunk size always give the same file, and large N is streamed chunk
+by chunk in bounded memory. .csv, .parquet and .feather outputs are written with pyarrow.
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_CHUNK_ROWS = 1_000_000
+TARGET = "prognosis"
+
+# P(symptom = 1 | class), the table malaria.py has always used
+MALARIA_PNEUMONIA = {
+    "Malaria": {
+        "high_fever": 0.9, "chills": 0.95, "vomiting": 0.6, "headache": 0.7, "sweating": 0.8, "muscle_pain": 0.8,
+        # Pneumonia symptoms should be RARE in Malaria
+        "cough": 0.1, "phlegm": 0.05, "breathlessness": 0.05, "chest_pain": 0.1, "fast_heart_rate": 0.2,
+        "fatigue": 0.8
+    },
+    "Pneumonia": {
+        "high_fever": 0.8, "chills": 0.2, "vomiting": 0.1, "headache": 0.3, "sweating": 0.3, "muscle_pain": 0.3,
+        # Pneumonia symptoms should be HIGH
+        "cough": 0.95, "phlegm": 0.9, "breathlessness": 0.9, "chest_pain": 0.8, "fast_heart_rate": 0.4,
+        "fatigue": 0.8
+    }
+}
+
+
+def probability_table(table):
+    """
+    (classes, symptoms, P) from {class: {symptom: p}} or a DataFrame indexed by class.
+    P is float32 of shape (n_classes, n_symptoms).
+    """
+    frame = table if isinstance(table, pd.DataFrame) else pd.DataFrame.from_dict(table, orient="index")
+    if frame.isna().any().any():
+        raise ValueError("every class needs a probability for every symptom")
+    P = frame.to_numpy(dtype=np.float32)
+    if ((P < 0) | (P > 1)).any():
+        raise ValueError("probabilities must lie in [0, 1]")
+    return [str(c) for c in frame.index], [str(c) for c in frame.columns], P
+
+
+def class_counts(n_rows, weights):
+    """
+    Split n_rows over the classes in proportion to weights (largest remainder).
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    exact = n_rows * weights / weights.sum()
+    counts = np.floor(exact).astype(np.int64)
+    counts[np.argsort(counts - exact)[:n_rows - counts.sum()]] += 1
+    return counts
+
+
+def generate_chunk(P, n_rows, weights, rng):
+    """
+    Labels (int, n_rows) and symptom matrix (uint8, n_rows x n_symptoms) for one chunk.
+    """
+    labels = rng.permutation(np.repeat(np.arange(len(P)), class_counts(n_rows, weights)))
+    X = (rng.random((n_rows, P.shape[1]), dtype=np.float32) < P[labels]).view(np.uint8)
+    return labels, X
+
+
+def iter_chunks(table=MALARIA_PNEUMONIA, n_rows=1000, seed=None, weights=None,
+                chunk_rows=DEFAULT_CHUNK_ROWS, target=TARGET):
+    """
+    Yield DataFrames of at most chunk_rows rows, n_rows in total. The target column is
+    categorical so large chunks stay small in memory.
+    """
+    classes, symptoms, P = probability_table(table)
+    weights = np.ones(len(classes)) if weights is None else np.asarray(weights, dtype=np.float64)
+    sizes = [min(chunk_rows, n_rows - start) for start in range(0, n_rows, chunk_rows)]
+    for size, child in zip(sizes, np.random.SeedSequence(seed).spawn(len(sizes))):
+        labels, X = generate_chunk(P, size, weights, np.random.default_rng(child))
+        chunk = pd.DataFrame(X, columns=symptoms)
+        chunk[target] = pd.Categorical.from_codes(labels, categories=classes)
+        yield chunk
+
+
+def generate(table=MALARIA_PNEUMONIA, n_rows=1000, seed=None, weights=None,
+             chunk_rows=DEFAULT_CHUNK_ROWS, target=TARGET):
+    """
+    The whole synthetic dataset as one DataFrame.
+    """
+    chunks = list(iter_chunks(table, n_rows, seed, weights, chunk_rows, target))
+    if not chunks:
+        return pd.DataFrame(columns=probability_table(table)[1] + [target])
+    return pd.concat(chunks, ignore_index=True)
+
+
+def write_dataset(path, table=MALARIA_PNEUMONIA, n_rows=1000, seed=None, weights=None,
+                  chunk_rows=DEFAULT_CHUNK_ROWS, target=TARGET):
+    """
+    Stream n_rows synthetic rows to path (.csv, .parquet or .feather); returns the row count.
+    """
+    import pyarrow as pa
+    import pyarrow.csv
+    import pyarrow.parquet
+
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in (".csv", ".parquet", ".feather"):
+        raise ValueError(f"unsupported output format {ext!r}; use .csv, .parquet or .feather")
+    writer, sink, written = None, None, 0
+    try:
+        for chunk in iter_chunks(table, n_rows, seed, weights, chunk_rows, target):
+            batch = pa.Table.from_pandas(chunk, preserve_index=False)
+            if ext == ".csv":
+                # Plain strings in the label column, as the training CSVs have
+                batch = batch.set_column(batch.num_columns - 1, target, batch.column(target).cast(pa.string()))
+            if writer is None:
+                if ext == ".csv":
+                    # Unquoted header and values, like pandas.to_csv
+                    sink = open(path, "wb")
+                    sink.write((",".join(batch.column_names) + "\n").encode("utf-8"))
+                    options = pyarrow.csv.WriteOptions(include_header=False, quoting_style="none")
+                    writer = pyarrow.csv.CSVWriter(sink, batch.schema, write_options=options)
+                elif ext == ".parquet":
+                    writer = pyarrow.parquet.ParquetWriter(path, batch.schema)
+                else:
+                    writer = pa.ipc.new_file(path, batch.schema)
+            writer.write_table(batch)
+            written += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+        if sink is not None:
+            sink.close()
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic symptom dataset from a probability table.")
+    parser.add_argument("out", help="Output file (.csv, .parquet or .feather)")
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--seed", type=int, help="Seed for a reproducible dataset (default: random)")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS, help="Rows generated and written at a time")
+    parser.add_argument("--table", help="JSON file {class: {symptom: probability}} (default: Malaria/Pneumonia)")
+    parser.add_argument("--weights", type=float, nargs="+", help="Relative share of each class (default: equal)")
+    args = parser.parse_args()
+
+    table = MALARIA_PNEUMONIA
+    if args.table:
+        with open(args.table, encoding="utf-8") as fh:
+            table = json.load(fh)
+    start = time.perf_counter()
+    n = write_dataset(args.out, table, args.rows, args.seed, args.weights, args.chunk_rows)
+    elapsed = time.perf_counter() - start
+    print(f"✅ {n:,} rows -> {args.out} in {elapsed:.2f}s ({n / max(elapsed, 1e-9):,.0f} rows/s)")
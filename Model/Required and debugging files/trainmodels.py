@@ -1,140 +1,417 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
 import pandas as pd
 import numpy as np
 import joblib
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
+from sklearn.compose import ColumnTransformer
 from sklearn.impute import SimpleImputer
-from sklearn.preprocessing import LabelEncoder
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OrdinalEncoder
+from compact_forest import save_compact
+from forest_arrays import save_forest
+from model_registry import ModelRegistry
 
 # ==========================================
-# 1. DATASET CONFIGURATION
+# 1. TRAINING SPEC
 # ==========================================
-dataset_config = {
-    "Diabetes": {
-        "path": "datasets/Healthcare-Diabetes.csv",
-        "target": "Outcome"
-    },
-    "Kidney": {
-        "path": "datasets/Chronic_Kidney_Dsease_data.csv",
-        "target": "Diagnosis"
-    },
-    "Liver": {
-        "path": "datasets/Liver_disease_data.csv",
-        "target": "Diagnosis"
-    },
-    "Heart": {
-        "path": "datasets/Cardiovascular_Disease_Dataset.csv",
-        "target": "target"
-    },
-    "Hypertension": {
-        "path": "datasets/hypertension_dataset.csv",
-        "target": "Hypertension"
-    },
-    "Malaria_Pneumonia": {
-        # IMPORTANT: This points to the new synthetic file you just created
-        "path": "datasets/SHER_Malaria_Pneumonia_Boosted.csv", 
-        "target": "prognosis"
-    }
-}
+# Every disease is declared in training_spec.json:
+#   path, target            dataset file and label column; .parquet/.feather files written by
+#                           preprocess_csv.py --format are read with only the needed columns
+#   drop_keywords/columns   columns removed before training (IDs, leaked scores)
+#   coerce_numeric          force every feature column to numbers
+#   target_map              relabel the target, e.g. {"ckd": 1, "notckd": 0}; labels compare as
+#                           text, with integral numbers written as integers (2.0 -> "2"). Files
+#                           whose labels are all target values already pass; other labels fail
+#   row_filter              {"column": ..., "contains": regex} rows to keep (column defaults to target)
+#   estimator               RandomForestClassifier hyperparameters
+# Keys under "defaults" apply to every disease unless it overrides them.
+SPEC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "training_spec.json")
+CACHE_PATH = ".train_cache.json"
+
+def load_spec(path=SPEC_PATH):
+    """
+    Read the spec file and return {disease: resolved config}.
+    """
+    with open(path, encoding="utf-8") as fh:
+        spec = json.load(fh)
+    defaults = spec.get("defaults", {})
+    resolved = {}
+    for disease, config in spec["diseases"].items():
+        merged = {**defaults, **config}
+        merged["estimator"] = {**defaults.get("estimator", {}), **config.get("estimator", {})}
+        resolved[disease] = merged
+    return resolved
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+COLUMNAR_EXTENSIONS = {".parquet": "parquet", ".pq": "parquet", ".feather": "feather", ".arrow": "feather"}
+
+def dropped_columns(columns, config):
+    """
+    Columns removed before training (drop_columns / drop_keywords), never the target.
+    """
+    target_col = config['target']
+    drop_keywords = config.get('drop_keywords', [])
+    drop_columns = set(config.get('drop_columns', []))
+    return [
+        c for c in columns
+        if c != target_col and (c in drop_columns or any(k in c for k in drop_keywords))
+    ]
+
+def load_dataset(config):
+    """
+    Read the dataset of a disease. CSV files are parsed whole; Parquet and Feather files
+    keep their stored dtypes and only the columns that survive the drop rules are read.
+    """
+    path = config['path']
+    fmt = COLUMNAR_EXTENSIONS.get(os.path.splitext(path)[1].lower())
+    if fmt is None:
+        return pd.read_csv(path)
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+
+    import pyarrow as pa
+    import pyarrow.parquet
+    if fmt == "parquet":
+        source = pyarrow.parquet.ParquetFile(path)
+        names = source.schema_arrow.names
+    else:
+        source = pa.ipc.open_file(pa.memory_map(path))
+        names = source.schema.names
+    dropped = set(dropped_columns([c.strip() for c in names], config))
+    columns = [c for c in names if c.strip() not in dropped]
+    table = source.read(columns=columns) if fmt == "parquet" else source.read_all().select(columns)
+
+    # The forest sees what a CSV would give: categories as plain text, dates as strings
+    dates = []
+    for i, field in enumerate(table.schema):
+        if pa.types.is_dictionary(field.type):
+            table = table.set_column(i, field.name, table.column(i).cast(field.type.value_type))
+        elif pa.types.is_timestamp(field.type) or pa.types.is_date(field.type):
+            dates.append(field.name)
+    df = table.to_pandas()
+    if dates:
+        df[dates] = df[dates].astype(str)
+    return df
+
+def spec_hash(config):
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()
+
+def load_cache(path=CACHE_PATH):
+    try:
+        with open(path, encoding="utf-8") as fh:
+            return json.load(fh)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_cache(cache, path=CACHE_PATH):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(cache, fh, indent=2)
+    os.replace(tmp, path)
 
 # ==========================================
-# 2. TRAINING LOOP
+# 2. TRAINING ONE DISEASE
 # ==========================================
-print("🚀 Starting Training Process...")
+STAGES = ["load", "clean", "impute", "fit", "score", "dump"]
+
+class StageTimer:
+    """
+    Records wall-clock seconds per training stage.
+    """
+    def __init__(self):
+        self.timings = {}
+        self._stage = None
+        self._start = None
+
+    def start(self, stage):
+        self.stop()
+        self._stage, self._start = stage, time.perf_counter()
 
-for disease, config in dataset_config.items():
+    def stop(self):
+        if self._stage is not None:
+            self.timings[self._stage] = time.perf_counter() - self._start
+            self._stage = None
+
+def target_label(value):
+    """
+    A target value as the text target_map keys are compared with: trimmed, lower
+    case, and integral numbers without a fraction, so 2, 2.0 and "2.0" all read "2".
+    """
+    text = str(value).strip().lower()
+    try:
+        number = float(text)
+    except ValueError:
+        return text
+    return str(int(number)) if number.is_integer() else text
+
+def prepare_dataset(df, config):
+    """
+    Apply the spec's cleaning steps to a loaded dataset and return (X, y).
+    """
+    # B. CLEAN COLUMN NAMES
+    df = df.rename(columns=str.strip)
+    target_col = config['target']
+
+    # C. DROP USELESS COLUMNS
+    # We remove IDs to prevent the model from memorizing row numbers
+    cols_to_drop = dropped_columns(df.columns, config)
+    if cols_to_drop:
+        df = df.drop(columns=cols_to_drop)
+
+    # D. DATASET FIXES (declared in the spec)
+    if config.get('coerce_numeric'):
+        for col in df.columns:
+            if col != target_col:
+                df[col] = pd.to_numeric(df[col], errors='coerce')
+
+    row_filter = config.get('row_filter')
+    if row_filter:
+        column = row_filter.get('column', target_col)
+        df = df[df[column].astype(str).str.contains(row_filter['contains'], case=False, na=False)]
+
+    target_map = config.get('target_map')
+    if target_map:
+        # e.g. Kidney 'ckd'/'notckd' -> 1/0, Liver 1/2 -> 1/0
+        # Labels are compared as text with integral numbers normalised, so a target read
+        # back as float (1.0 from a cleaned Parquet file) still matches the key "1"
+        mapping = {target_label(k): v for k, v in target_map.items()}
+        labels = df[target_col].map(target_label, na_action='ignore')
+        present = set(labels.dropna())
+        encoded = {target_label(v): v for v in target_map.values()}
+        if present <= set(mapping):
+            df[target_col] = labels.map(mapping)
+        elif present <= set(encoded):
+            df[target_col] = labels.map(encoded)  # already encoded
+        else:
+            unknown = sorted(present - set(mapping) - set(encoded))
+            raise ValueError(
+                f"Target '{target_col}' has labels {unknown[:10]} that target_map {target_map} does not cover"
+            )
+
+    # E. SEPARATE FEATURES AND TARGET
+    X = df.drop(columns=[target_col])
+    y = df[target_col]
+
+    # F. REMOVE ROWS WITH MISSING TARGETS
+    if y.isnull().any():
+        X = X[~y.isnull()]
+        y = y[~y.isnull()]
+    return X, y
+
+def split_dataset(X, y, config):
+    """
+    The spec's train/test split: (X_train, X_test, y_train, y_test).
+    """
+    return train_test_split(
+        X, y, test_size=config.get('test_size', 0.2), random_state=config.get('split_random_state', 42)
+    )
+
+def build_preprocessing(X):
+    """
+    Column-wise preprocessing fitted before the forest:
+    1. Fill Numbers with Average
+    2. Fill Text with "Missing" & Convert to Numbers (unseen categories -> -1)
+    Other columns (e.g. booleans) pass through unchanged.
+    """
+    num_cols = X.select_dtypes(include='number').columns.tolist()
+    cat_cols = X.select_dtypes(include=['object']).columns.tolist()
+    categorical = Pipeline([
+        ("fill", SimpleImputer(strategy='constant', fill_value="Missing")),
+        ("encode", OrdinalEncoder(handle_unknown='use_encoded_value', unknown_value=-1))
+    ])
+    return ColumnTransformer(
+        [("num", SimpleImputer(strategy='mean', keep_empty_features=True), num_cols),
+         ("cat", categorical, cat_cols)],
+        remainder='passthrough'
+    )
+
+def train_disease(disease, config, n_jobs=1, registry=None):
+    """
+    Train, score and save the model of one disease.
+    With registry (a model_registry.py root folder) the model is also registered
+    there as a new version and activated.
+    Returns a summary dict with the accuracy, per-stage timings and any error.
+    """
+    timer = StageTimer()
+    result = {"disease": disease, "accuracy": None, "timings": timer.timings, "error": None}
     print(f"\n----------------\nProcessing {disease}...")
-    
+
     try:
         # A. LOAD DATA
+        timer.start("load")
         try:
-            df = pd.read_csv(config['path'])
+            df = load_dataset(config)
         except FileNotFoundError:
             print(f"❌ Error: File not found at {config['path']}")
-            continue
+            result["error"] = "file not found"
+            return result
 
-        # B. CLEAN COLUMN NAMES
-        df.columns = df.columns.str.strip()
-        target_col = config['target']
-        
-        # C. DROP USELESS COLUMNS
-        # We remove IDs to prevent the model from memorizing row numbers
-        drop_keywords = ['id', 'ID', 'unnamed', 'Doctor', 'PatientID', 'risk_score', 'risk_level'] 
-        cols_to_drop = [c for c in df.columns if any(k in c for k in drop_keywords)]
-        if cols_to_drop:
-            df = df.drop(columns=cols_to_drop)
-
-        # D. SPECIFIC DISEASE FIXES
-        
-        # --- FIX: KIDNEY ---
-        # Converts 'ckd'/'notckd' text to 1/0 numbers
-        if disease == "Kidney":
-            # Force numeric conversion for everything first
-            for col in df.columns:
-                if col != target_col:
-                    df[col] = pd.to_numeric(df[col], errors='coerce')
-            
-            # clean target column
-            df[target_col] = df[target_col].astype(str).str.strip().str.lower()
-            df[target_col] = df[target_col].map({'ckd': 1, 'notckd': 0})
-            
-            # If mapping failed, try factorize as backup
-            if df[target_col].isnull().all():
-                df[target_col] = pd.factorize(df[target_col])[0]
-
-        # --- FIX: LIVER ---
-        # Liver dataset often uses 1 and 2. We map them to 0 and 1.
-        if disease == "Liver":
-            if df[target_col].max() > 1:
-                df[target_col] = df[target_col].map({2: 0, 1: 1})
-
-        # --- FIX: MALARIA / PNEUMONIA ---
-        # Ensure we are strictly predicting these two, even if using boosted data
-        if disease == "Malaria_Pneumonia":
-            # Filter rows just in case the file has other stuff
-            df = df[df[target_col].astype(str).str.contains("Malaria|Pneumonia", case=False, na=False)]
-
-        # E. SEPARATE FEATURES AND TARGET
-        X = df.drop(columns=[target_col])
-        y = df[target_col]
-
-        # F. HANDLE MISSING VALUES (Imputation)
-        # 1. Fill Numbers with Average
-        num_cols = X.select_dtypes(include=['float64', 'int64']).columns
-        if len(num_cols) > 0:
-            imputer = SimpleImputer(strategy='mean')
-            X[num_cols] = imputer.fit_transform(X[num_cols])
-
-        # 2. Fill Text with "Missing" & Convert to Numbers
-        cat_cols = X.select_dtypes(include=['object']).columns
-        for col in cat_cols:
-            X[col] = X[col].fillna("Missing")
-            le = LabelEncoder()
-            X[col] = le.fit_transform(X[col].astype(str))
-
-        # G. REMOVE ROWS WITH MISSING TARGETS
-        if y.isnull().any():
-            X = X[~y.isnull()]
-            y = y[~y.isnull()]
+        # B-F. CLEAN, DROP, FIX AND SPLIT OFF THE TARGET (see prepare_dataset)
+        timer.start("clean")
+        X, y = prepare_dataset(df, config)
+
+        X_train, X_test, y_train, y_test = split_dataset(X, y, config)
 
-        # H. TRAIN THE MODEL
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-        
         if len(X_train) == 0:
             print(f"❌ Error: Not enough data to train {disease}")
-            continue
+            result["error"] = "not enough data"
+            return result
+
+        # G. HANDLE MISSING VALUES (Imputation)
+        # Fitted on the training split and saved with the forest, so inference
+        # applies exactly the same transforms to named inputs.
+        timer.start("impute")
+        preprocess = build_preprocessing(X_train)
+        X_train_encoded = preprocess.fit_transform(X_train)
 
-        model = RandomForestClassifier(n_estimators=100, random_state=42)
-        model.fit(X_train, y_train)
+        # H. TRAIN THE MODEL
+        timer.start("fit")
+        forest = RandomForestClassifier(**config['estimator'], n_jobs=n_jobs)
+        forest.fit(X_train_encoded, y_train)
+        model = Pipeline([("preprocess", preprocess), ("forest", forest)])
         
         # I. SAVE THE MODEL
+        timer.start("score")
         accuracy = model.score(X_test, y_test)
+        result["accuracy"] = accuracy
+
+        timer.start("dump")
         filename = f'model_{disease}.sav'
+        # Saved single-threaded: prediction is one row at a time, where thread dispatch only adds latency
+        model.set_params(forest__n_jobs=None)
         joblib.dump(model, filename)
+
+        # Memory-mappable copy (model_<Disease>/) shared by all serving processes
+        save_forest(model, f'model_{disease}')
+        # Quantized single-file copy, loaded without pickle (see compact_forest.py)
+        try:
+            save_compact(model, f'model_{disease}.sherbin')
+        except ValueError as e:
+            print(f"⚠️ {disease}: no compact export ({e})")
+
+        if registry:
+            result["version"] = ModelRegistry(registry).register(
+                disease, model,
+                data_hash=file_hash(config['path']),
+                metrics={"accuracy": accuracy, "n_train": len(X_train), "n_test": len(X_test)}
+            )
+        timer.stop()
         
         print(f"✅ SUCCESS! {disease} Model Accuracy: {accuracy*100:.2f}%")
+        if result.get("version"):
+            print(f"📦 Registered {disease} {result['version']} in {registry}/")
 
     except Exception as e:
         print(f"❌ CRITICAL ERROR in {disease}: {e}")
+        result["error"] = str(e)
+    finally:
+        timer.stop()
+
+    return result
+
+# ==========================================
+# 3. TRAINING LOOP
+# ==========================================
+
+def print_timing_table(results, total):
+    header = f"{'Disease':<20}" + "".join(f"{stage:>9}" for stage in STAGES) + f"{'total':>9}  {'accuracy':>9}"
+    print("\n⏱️ Timings (seconds)")
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        accuracy = f"{r['accuracy']*100:>8.2f}%" if r["accuracy"] is not None else f"{'failed':>9}"
+        if r.get("cached"):
+            print(f"{r['disease']:<20}{'(unchanged, cached)':>{9 * (len(STAGES) + 1)}}  {accuracy}")
+            continue
+        cells = "".join(f"{r['timings'].get(stage, 0.0):>9.2f}" for stage in STAGES)
+        print(f"{r['disease']:<20}{cells}{sum(r['timings'].values()):>9.2f}  {accuracy}")
+    print(f"Wall clock: {total:.2f}s")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the disease models declared in the training spec.")
+    parser.add_argument("--spec", default=SPEC_PATH, help="Training spec JSON (default: training_spec.json)")
+    parser.add_argument("--diseases", nargs="+", help="Diseases to train (default: all in the spec)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Diseases trained concurrently (default: one per disease, up to the CPU count)")
+    parser.add_argument("--n-jobs", type=int, default=None,
+                        help="Threads per forest (default: the cores left over per worker)")
+    parser.add_argument("--force", action="store_true",
+                        help="Retrain even if neither the data nor the spec changed since the last run")
+    parser.add_argument("--registry", help="Also register every trained model as a new version in this registry folder")
+    parser.add_argument("--compress", type=float, metavar="TOLERANCE",
+                        help="Afterwards search for smaller forests within this accuracy/AUC drop (see compress_models.py)")
+    args = parser.parse_args(argv)
+
+    spec = load_spec(args.spec)
+    diseases = args.diseases or list(spec)
+    unknown = [d for d in diseases if d not in spec]
+    if unknown:
+        parser.error(f"not in the spec: {', '.join(unknown)}")
+
+    print("🚀 Starting Training Process...")
+    start = time.perf_counter()
+
+    # Skip diseases whose dataset and spec are unchanged since their last successful run
+    cache = load_cache()
+    results, to_train, fingerprints = [], [], {}
+    for disease in diseases:
+        config = spec[disease]
+        data_hash = file_hash(config['path']) if os.path.exists(config['path']) else None
+        fingerprints[disease] = {"data_hash": data_hash, "spec_hash": spec_hash(config)}
+        cached = cache.get(disease)
+        unchanged = (
+            cached is not None and data_hash is not None
+            and {k: cached.get(k) for k in fingerprints[disease]} == fingerprints[disease]
+            and os.path.exists(f'model_{disease}.sav')
+        )
+        if unchanged and not args.force:
+            print(f"⏭️ {disease}: data and spec unchanged, keeping model_{disease}.sav")
+            results.append({"disease": disease, "accuracy": cached.get("accuracy"), "timings": {}, "error": None, "cached": True})
+        else:
+            to_train.append(disease)
+
+    if to_train:
+        cpus = os.cpu_count() or 1
+        workers = max(1, min(args.workers or cpus, len(to_train)))
+        n_jobs = args.n_jobs or max(1, cpus // workers)
+        print(f"Training {len(to_train)} model(s) with {workers} worker(s), {n_jobs} thread(s) per forest")
+
+        if workers == 1:
+            results += [train_disease(d, spec[d], n_jobs, args.registry) for d in to_train]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(train_disease, d, spec[d], n_jobs, args.registry) for d in to_train]
+                results += [f.result() for f in as_completed(futures)]
+
+    for r in results:
+        if not r.get("cached") and r["error"] is None:
+            cache[r["disease"]] = {**fingerprints[r["disease"]], "accuracy": r["accuracy"], "timings": r["timings"]}
+    save_cache(cache)
+
+    results.sort(key=lambda r: diseases.index(r["disease"]))
+    print_timing_table(results, time.perf_counter() - start)
+
+    if args.compress is not None:
+        from compress_models import main as compress
+        trained = [r["disease"] for r in results if r["error"] is None]
+        if trained:
+            compress(["--spec", args.spec, "--tolerance", str(args.compress), "--diseases", *trained]
+                     + (["--registry", args.registry] if args.registry else []))
+    print("\n🎉 All models processed.")
+    return results
 
-print("\n🎉 All models processed.")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import argparse
+import os
+import sys
+
+import joblib
+import numpy as np
+
+from inference import MODEL_FILES, FEATURE_LAYOUTS, build_features, disease_probabilities, get_risk_level, predict
+
+# Checks that predict() (one predict_proba call, label = argmax) gives the same
+# label, probability of disease and risk level as the old path that called
+# model.predict() and then model.predict_proba() on the same row.
+# Usage: python verify_single_proba.py [--model-dir ../core_models]
+# Exits with status 1 on any mismatch, or when no model could be checked.
+
+DEFAULT_MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "core_models")
+
+def legacy_label_and_proba(model, input_data):
+    prediction = model.predict(input_data)[0]
+    probs = model.predict_proba(input_data)[0]
+    return prediction, probs
+
+def sample_inputs(model_name, model, n=300, seed=42):
+    rng = np.random.default_rng(seed)
+    fields = [field for field, _ in FEATURE_LAYOUTS.get(model_name, [])]
+    inputs = [build_features(model_name, model, {field: 0 for field in fields})]
+    for _ in range(n):
+        record = {field: rng.choice([rng.integers(0, 2), rng.integers(0, 4), rng.uniform(0, 300)]) for field in fields}
+        inputs.append(build_features(model_name, model, record))
+    return inputs
+
+def verify_model(name, model):
+    """
+    Number of rows checked and of rows where predict() disagrees with the legacy path.
+    """
+    mismatches = 0
+    rows = sample_inputs(name, model)
+    for input_data in rows:
+        old_prediction, old_probs = legacy_label_and_proba(model, input_data)
+        _, (old_probability,) = disease_probabilities(name, model.classes_, old_probs[None, :])
+        result = predict(name, model, input_data)
+
+        if (result["prediction"] != old_prediction
+                or not np.isclose(result["probability"], old_probability)
+                or result["risk_level"] != get_risk_level(old_probability)):
+            mismatches += 1
+    return len(rows), mismatches
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare predict() with the legacy predict + predict_proba path.")
+    parser.add_argument("--model-dir", default=DEFAULT_MODEL_DIR, help="Folder containing the model_<Disease>.sav files")
+    args = parser.parse_args()
+
+    failures, checked = 0, 0
+    for name, filename in MODEL_FILES.items():
+        path = os.path.join(args.model_dir, filename)
+        if not os.path.exists(path):
+            print(f"{name}: skipped ({path} not found)")
+            continue
+        model = joblib.load(path)
+        rows, mismatches = verify_model(name, model)
+        checked += 1
+        failures += mismatches
+        print(f"{name}: {rows} rows, {mismatches} mismatches")
+
+    if not checked:
+        print(f"VERIFICATION FAILED: no model found in {args.model_dir}")
+        sys.exit(1)
+    if failures:
+        print(f"VERIFICATION FAILED: {failures} mismatches")
+        sys.exit(1)
+    print(f"VERIFICATION SUCCESSFUL: {checked} models match the predict() + predict_proba() path.")
@@ -0,0 +1,113 @@
+"""
+Benchmark of the vectorized cleaning in preprocess_csv.py against the previous
+per-column loops.
+Usage: python benchmark_preprocess.py [file.csv ...] [--widen 6] [--repeat 5]
+
+By default every CSV in DATASETS/ is used, plus a wide copy of SHER_2.csv (its
+columns repeated --widen times) standing in for the ~300-column SHER exports.
+Both versions clean the same loaded frame (summary before, cleaning, summary after;
+file I/O is excluded) and their cleaned frames are compared.
+"""
+from __future__ import annotations
+import argparse
+import glob
+import os
+import time
+import warnings
+
+import pandas as pd
+
+from preprocess_csv import clean_frame, detect_delimiter, summarize_df
+
+DATASETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'DATASETS')
+
+
+def legacy_summarize_df(df: pd.DataFrame) -> dict:
+    s = {'n_rows': len(df), 'n_cols': len(df.columns), 'columns': {}}
+    for c in df.columns:
+        col = df[c]
+        s['columns'][c] = {
+            'dtype': str(col.dtype),
+            'n_missing': int(col.isna().sum()),
+            'n_unique': int(col.nunique(dropna=True))
+        }
+    return s
+
+
+def legacy_clean(df: pd.DataFrame) -> pd.DataFrame:
+    """The cleaning steps of preprocess() before they were vectorized."""
+    legacy_summarize_df(df)
+    df = df.drop_duplicates()
+    for c in df.select_dtypes(include=['object']).columns.tolist():
+        df[c] = df[c].where(df[c].isna(), df[c].astype(str).str.strip())
+    for c in df.columns:
+        if df[c].dtype == 'object':
+            coerced = pd.to_numeric(df[c].dropna().str.replace(',', ''), errors='coerce')
+            if len(coerced) > 0 and coerced.notna().sum() / len(coerced) > 0.9:
+                df[c] = pd.to_numeric(df[c].str.replace(',', ''), errors='coerce')
+    for c in df.columns:
+        if df[c].dtype == 'object':
+            try:
+                parsed = pd.to_datetime(df[c], errors='coerce', infer_datetime_format=True)
+                if parsed.notna().sum() / max(1, len(parsed.dropna())) > 0.5:
+                    df[c] = parsed
+            except Exception:
+                pass
+    for c in df.columns:
+        if df[c].isna().sum() == 0:
+            continue
+        if pd.api.types.is_numeric_dtype(df[c].dtype):
+            df[c] = df[c].fillna(df[c].median())
+        else:
+            mode = df[c].mode(dropna=True)
+            if not mode.empty:
+                df[c] = df[c].fillna(mode.iloc[0])
+    legacy_summarize_df(df)
+    return df
+
+
+def vectorized_clean(df: pd.DataFrame) -> pd.DataFrame:
+    summarize_df(df)
+    df, _ = clean_frame(df)
+    summarize_df(df)
+    return df
+
+
+def best_time(fn, df: pd.DataFrame, repeat: int) -> tuple[float, pd.DataFrame]:
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        frame = df.copy()
+        start = time.perf_counter()
+        result = fn(frame)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def load_datasets(paths: list[str], widen: int) -> dict[str, pd.DataFrame]:
+    frames = {}
+    for path in paths:
+        frames[os.path.basename(path)] = pd.read_csv(path, sep=detect_delimiter(path))
+    sher = os.path.join(DATASETS_DIR, 'SHER_2.csv')
+    if widen > 1 and os.path.exists(sher):
+        base = pd.read_csv(sher)
+        wide = pd.concat([base.add_suffix(f'_{i}') if i else base for i in range(widen)], axis=1)
+        frames[f'SHER_2.csv x{widen} columns'] = wide
+    return frames
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time legacy vs vectorized CSV cleaning.')
+    parser.add_argument('csv', nargs='*', help='CSV files (default: DATASETS/*.csv)')
+    parser.add_argument('--widen', type=int, default=6, help='Column copies of SHER_2.csv for the wide case (1 = off)')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per version; the best is reported')
+    args = parser.parse_args()
+    warnings.simplefilter('ignore')
+
+    paths = args.csv or sorted(glob.glob(os.path.join(DATASETS_DIR, '*.csv')))
+    print(f"{'dataset':<40}{'shape':>14}{'legacy ms':>12}{'vector ms':>12}{'speedup':>9}  same output")
+    for name, df in load_datasets(paths, args.widen).items():
+        legacy_s, legacy_df = best_time(legacy_clean, df, args.repeat)
+        vector_s, vector_df = best_time(vectorized_clean, df, args.repeat)
+        same = legacy_df.astype(str).reset_index(drop=True).equals(vector_df.astype(str).reset_index(drop=True))
+        shape = f'{df.shape[0]}x{df.shape[1]}'
+        print(f'{name:<40}{shape:>14}{legacy_s * 1000:>12.1f}{vector_s * 1000:>12.1f}{legacy_s / vector_s:>8.1f}x  {same}')